@@ -0,0 +1,156 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import cache
+import power
+import scheduler
+import session
+
+# Exact models are expected to take this many times longer than the bounds alone (LB+UB)
+MODEL_COST_FACTOR = 100
+
+
+# The columns of a results row that describe the run of config on graph, whatever its outcome
+def run_row(config, graph, status):
+    return {"Instance": config['Instance'], "Problem": config['Problem'], "Model": config['Model'],
+            "Search": config.get('Search', "off"), "s": config['s'], "|V|": graph.number_of_nodes(),
+            "|E|": graph.number_of_edges(), "Status": status}
+
+
+# Run one config entry and return its row of the results csv file. An instance whose distance balls would not
+# fit in memory is not solved: its row has the status "out of memory" with the estimate, and N/A results
+def run_config(config):
+    problem = config['Problem']
+    s = config['s']
+    base = config['Model']
+    instance = config['Instance']
+    if problem == "LB+UB":
+        UB_mode = base
+    else:
+        # The default UB_mode is IP unless specified otherwise
+        UB_mode = "IP"
+    print("Solving " + instance + " under " + base + " model:")
+
+    # Parameters of all the Gurobi models of the run, inherited by the component workers
+    session.configure(OutputFlag=config.get('Gurobi Output', 1))
+
+    # Start the time counter
+    total_start = time.time()
+
+    # Read file and find connected components of G (both cached on disk)
+    graph_key, graph, components = cache.load_graph("../data/", instance)
+    print("# of nodes of G: ", graph.number_of_nodes())
+    print("# of edges of G: ", graph.number_of_edges())
+
+    # Distances up to s in every component, shared by the bounds and the exact models (cached on disk)
+    try:
+        dist_indices = cache.distance_indices(graph_key, graph, components, s)
+    except MemoryError as e:
+        print("Skipping " + instance + ":", e)
+        result = run_row(config, graph, "out of memory: " + str(e))
+        for field in ["LB", "LB Time (seconds)", "UB", "UB Time (seconds)", "Objective Value", "Objective Bound"]:
+            result[field] = "N/A"
+        result["Total Time (seconds)"] = '{0:.2f}'.format(time.time() - total_start)
+        return result
+
+    # Initialize final variables
+    if problem == "LB+UB":
+        obj_Value = "N/A"
+        obj_Bound = "N/A"
+    else:
+        obj_Value = 0
+        obj_Bound = 0
+    LB = 0
+    LB_Time = 0
+    UB = 0
+    UB_Time = 0
+
+    # Solve the components in parallel and add up their results
+    component_results = scheduler.solve_components(graph_key, graph, components, dist_indices, s, problem, base,
+                                                   UB_mode, config)
+    for iteration, component_result in enumerate(component_results):
+        print("Component", iteration, "with", component_result["|V|"], "nodes solved in",
+              '{0:.2f}'.format(component_result["Time"]), "seconds")
+        LB_Time += component_result["LB Time"]
+        LB += component_result["LB"]
+        UB_Time += component_result["UB Time"]
+        UB += component_result["UB"]
+
+        # Add iteration variables to final variables
+        if problem != "LB+UB":
+            obj_Value += component_result["Objective Value"]
+            obj_Bound += component_result["Objective Bound"]
+
+    # Finish time counter
+    finish_time = time.time()
+    total_time = finish_time - total_start
+
+    # Final results for the .csv file
+    result = run_row(config, graph, "solved")
+    result["LB"] = LB
+    result["LB Time (seconds)"] = '{0:.2f}'.format(LB_Time)
+    result["UB"] = UB
+    result["UB Time (seconds)"] = '{0:.2f}'.format(UB_Time)
+    result["Total Time (seconds)"] = '{0:.2f}'.format(total_time)
+    result["Objective Value"] = obj_Value
+    result["Objective Bound"] = obj_Bound
+    return result
+
+
+# Number of threads a config entry uses: its component workers or its Gurobi threads, whichever is larger.
+# Inside a batch, the entries run with a single worker and a single Gurobi thread unless specified otherwise
+def job_threads(config):
+    return max(config.get('Workers', 1), config.get('Threads', 1))
+
+
+# Expected cost and memory of a config entry, both estimated from the size of the distance balls of
+# radius s. The cost of the exact models is scaled up by MODEL_COST_FACTOR
+def job_estimates(config):
+    _, graph, _ = cache.load_graph("../data/", config['Instance'])
+    memory = power.estimate_power_bytes(graph.indptr, graph.indices, config['s'])
+    cost = power.estimate_power_entries(graph.indptr, graph.indices, config['s'])
+    if config['Problem'] != "LB+UB":
+        cost *= MODEL_COST_FACTOR
+    return cost, memory
+
+
+# Run all the config entries of a batch, calling write_row on every results row (in the calling process,
+# as the jobs finish). Jobs are started longest-first in worker processes as long as the threads in use stay
+# within max_threads and the estimated memory within max_bytes; a job that exceeds them on its own is
+# started once nothing else is running. With max_threads = 1, a single entry, or where fork is not available,
+# the entries are run one at a time in their order in the batch, each with its own component workers
+def run_batch(batch_configs, write_row, max_threads=None, max_bytes=power.MAX_POWER_BYTES):
+    if max_threads is None:
+        max_threads = os.cpu_count() or 1
+    if max_threads == 1 or len(batch_configs) == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for config in batch_configs.values():
+            write_row(run_config(config))
+        return
+
+    configs = [dict(config, Workers=config.get('Workers', 1), Threads=config.get('Threads', 1))
+               for config in batch_configs.values()]
+    estimates = [job_estimates(config) for config in configs]
+    pending = sorted(range(len(configs)), key=lambda j: estimates[j][0], reverse=True)
+    running = {}
+    threads_in_use = 0
+    bytes_in_use = 0
+    with ProcessPoolExecutor(max_workers=max_threads, mp_context=multiprocessing.get_context("fork")) as executor:
+        while pending or running:
+            # Start every pending job that fits in the remaining resources, longest first
+            for j in list(pending):
+                threads, memory = job_threads(configs[j]), estimates[j][1]
+                if running and (threads_in_use + threads > max_threads or bytes_in_use + memory > max_bytes):
+                    continue
+                running[executor.submit(run_config, configs[j])] = j
+                threads_in_use += threads
+                bytes_in_use += memory
+                pending.remove(j)
+
+            # Wait for a job to finish and release its resources
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                j = running.pop(future)
+                threads_in_use -= job_threads(configs[j])
+                bytes_in_use -= estimates[j][1]
+                write_row(future.result())
@@ -0,0 +1,59 @@
+import math
+import time
+import multiprocessing
+
+# Shares of the time budget of an instance (the "Time Limit" key) for the lower and the upper bounds of its
+# components. The exact models get the rest of the budget, together with the time the bounds leave unused
+LB_SHARE = 0.05
+UB_SHARE = 0.05
+
+# Set once the instance being solved is closed (see closed): the running solves stop at their next callback.
+# A new event is started for every instance, before its component workers are forked
+STOP = None
+
+
+def start_instance():
+    global STOP
+    STOP = multiprocessing.Event()
+
+
+def stopped():
+    return STOP is not None and STOP.is_set()
+
+
+# Wall-clock budget of the components of an instance. The bounds of all the components are due by
+# bound_deadline, and the exact models (if any) by deadline
+class Budget:
+    def __init__(self, time_limit, exact=True):
+        self.start = time.time()
+        self.deadline = self.start + time_limit
+        self.bound_deadline = self.start + (LB_SHARE + UB_SHARE) * time_limit if exact else self.deadline
+
+    # Time limit of a task of the given weight, started while the tasks of total weight pending (this one
+    # included) wait for one of the workers: its share of the time of all the workers until deadline, and at
+    # most the time left. A task that finishes early leaves its time to the tasks started after it
+    def share(self, weight, pending, workers, deadline):
+        left = max(0.0, deadline - time.time())
+        return min(left, workers * left * weight / pending) if pending > 0 else left
+
+    def expired(self):
+        return time.time() >= self.deadline
+
+
+# Priority of a component in the exact phase: the largest gap UB - LB first, then the largest component. Its
+# product is the weight of the component in the budget
+def priority(result):
+    return result["UB"] - result["LB"], result["|V|"]
+
+
+def weight(result):
+    return (result["UB"] - result["LB"]) * result["|V|"]
+
+
+# Whether the components of an instance are solved together: the summed bound meets the summed incumbent,
+# or is within the relative gap of it. The incumbent of a component is its objective value, or its upper
+# bound before its exact model is solved, and its bound the objective bound, or its lower bound
+def closed(results, gap=0.0):
+    value = sum(result.get("Objective Value", result["UB"]) for result in results)
+    bound = sum(result.get("Objective Bound", result["LB"]) for result in results)
+    return math.ceil(bound - 1e-6) >= value or value - bound <= gap * value
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import zipfile
+import numpy as np
+import read
+import power
+from distance import DistanceIndex
+
+# Location of the on-disk cache and its size limit. Entries are evicted least-recently-used first
+CACHE_DIR = os.path.join("..", "cache")
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+# Arrays of the graph, distance and bound entries
+GRAPH_FIELDS = ("n", "indptr", "indices", "order", "sizes")
+DISTANCE_FIELDS = ("row_counts", "entry_counts", "row_lengths", "ball_indices", "ball_dist")
+BOUND_FIELDS = ("order", "sizes", "status", "final", "time_limit")
+
+# Content hashes of the files already hashed in this process, keyed by (path, size, mtime)
+_file_hashes = {}
+
+
+# Content hash of a file. Cache entries are keyed by it, so they are invalidated when the file changes
+def file_hash(fname):
+    stat = os.stat(fname)
+    signature = (os.path.abspath(fname), stat.st_size, stat.st_mtime_ns)
+    if signature not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(fname, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _file_hashes[signature] = digest.hexdigest()[:32]
+    return _file_hashes[signature]
+
+
+def entry_path(key, name):
+    return os.path.join(CACHE_DIR, key + "_" + name + ".npz")
+
+
+# Load the arrays stored under (key, name), or None if there is no such entry. An entry that cannot be read or
+# lacks one of fields (a corrupt entry, or one written by an older version) is deleted, so that it is rebuilt
+def load_arrays(key, name, fields=()):
+    path = entry_path(key, name)
+    try:
+        with np.load(path) as data:
+            arrays = {field: data[field] for field in data.files}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile, KeyError):
+        discard(path)
+        return None
+    if any(field not in arrays for field in fields):
+        discard(path)
+        return None
+    # Mark the entry as recently used, unless another process has just evicted it
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return arrays
+
+
+# Delete a cache entry, unless another process has already done it
+def discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Store the arrays under (key, name) as a compressed .npz file and evict old entries if needed
+def save_arrays(key, name, **arrays):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = entry_path(key, name)
+    temporary = path + "." + str(os.getpid()) + ".tmp"
+    with open(temporary, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(temporary, path)
+    evict(MAX_CACHE_BYTES)
+
+
+# Delete the least recently used entries until the cache takes at most max_bytes. The temporary files of
+# the entries that other processes are writing (see save_arrays) are left alone
+def evict(max_bytes):
+    entries = []
+    for fname in os.listdir(CACHE_DIR):
+        if fname.endswith(".tmp"):
+            continue
+        path = os.path.join(CACHE_DIR, fname)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        discard(path)
+        total -= size
+
+
+# Read an instance and its connected components, going through the cache.
+# Returns the cache key of the instance, its CSRGraph and the vertex arrays of its components
+def load_graph(ext, instance):
+    fname, _ = read.find_file(ext, instance)
+    key = file_hash(fname)
+    arrays = load_arrays(key, "graph", GRAPH_FIELDS)
+    if arrays is not None:
+        graph = read.CSRGraph(int(arrays["n"]), arrays["indptr"], arrays["indices"])
+        components = np.split(arrays["order"], np.cumsum(arrays["sizes"])[:-1])
+        return key, graph, components
+
+    graph = read.load_graph(ext, instance)
+    components = graph.components()
+    save_arrays(key, "graph", n=np.array(graph.n), indptr=graph.indptr, indices=graph.indices,
+                order=np.concatenate(components), sizes=np.array([len(c) for c in components]))
+    return key, graph, components
+
+
+# Distance indices (truncated at s) of all the components, going through the cache
+def distance_indices(key, graph, components, s):
+    name = "dist_s" + str(s)
+    subgraphs = [graph.subgraph(component) for component in components]
+    arrays = load_arrays(key, name, DISTANCE_FIELDS)
+    if arrays is not None:
+        # Every component owns a contiguous block of rows and entries
+        row_ends = np.cumsum(arrays["row_counts"])
+        entry_ends = np.cumsum(arrays["entry_counts"])
+        indices = []
+        for c, subgraph in enumerate(subgraphs):
+            rows = arrays["row_lengths"][row_ends[c] - subgraph.n:row_ends[c]]
+            ball_indptr = np.zeros(subgraph.n + 1, dtype=np.int64)
+            np.cumsum(rows, out=ball_indptr[1:])
+            start = entry_ends[c] - ball_indptr[-1]
+            indices.append(DistanceIndex(subgraph.indptr, subgraph.indices, s, ball_indptr,
+                                         arrays["ball_indices"][start:entry_ends[c]],
+                                         arrays["ball_dist"][start:entry_ends[c]]))
+        return indices
+
+    # Refuse to build the distance balls if they would not fit in memory
+    estimated_bytes = sum(power.estimate_power_bytes(subgraph.indptr, subgraph.indices, s) for subgraph in subgraphs)
+    if estimated_bytes > power.MAX_POWER_BYTES:
+        raise MemoryError("The distance balls of radius " + str(s) + " need about " +
+                          str(round(estimated_bytes / 1024 ** 3, 2)) + " GB (limit: " +
+                          str(round(power.MAX_POWER_BYTES / 1024 ** 3, 2)) + " GB)")
+
+    indices = [DistanceIndex.from_arrays(subgraph.indptr, subgraph.indices, s) for subgraph in subgraphs]
+    save_arrays(key, name,
+                row_counts=np.array([index.n for index in indices], dtype=np.int64),
+                entry_counts=np.array([len(index.ball_indices) for index in indices], dtype=np.int64),
+                row_lengths=np.concatenate([np.diff(index.ball_indptr) for index in indices]),
+                ball_indices=np.concatenate([index.ball_indices for index in indices]),
+                ball_dist=np.concatenate([index.ball_dist for index in indices]))
+    return indices
+
+
+def bound_name(component, s, bound, mode):
+    return "_".join([bound, "s" + str(s), "c" + str(component), mode])
+
+
+# Bound (a list of vertex lists) of a component, computed in the given mode by a solver with a time limit,
+# together with the status of its model (None for the combinatorial heuristics). An entry cut off by its
+# time limit is returned only if that limit was at least time_limit, i.e., only if it is at least as strong
+# as a new run. Returns None otherwise
+def load_bound(key, component, s, bound, mode, time_limit):
+    arrays = load_arrays(key, bound_name(component, s, bound, mode), BOUND_FIELDS)
+    if arrays is None:
+        return None
+    if not arrays["final"] and arrays["time_limit"] < time_limit:
+        return None
+    sets = np.split(arrays["order"], np.cumsum(arrays["sizes"])[:-1]) if len(arrays["sizes"]) else []
+    status = int(arrays["status"])
+    return [vertices.tolist() for vertices in sets], (None if status < 0 else status)
+
+
+# Store a bound computed within time_limit. final tells whether a longer run would compute the same bound
+def save_bound(key, component, s, bound, mode, sets, status, final, time_limit):
+    save_arrays(key, bound_name(component, s, bound, mode),
+                order=np.array([vertex for vertices in sets for vertex in vertices], dtype=np.int64),
+                sizes=np.array([len(vertices) for vertices in sets], dtype=np.int64),
+                status=np.array(-1 if status is None else status), final=np.array(final),
+                time_limit=np.array(time_limit))
+
+
+# Store the bound of the component source as the bound of an isomorphic component target, renaming every
+# vertex v of source to mapping[v] (an array)
+def map_bound(key, source, target, s, bound, mode, mapping):
+    arrays = load_arrays(key, bound_name(source, s, bound, mode), BOUND_FIELDS)
+    if arrays is None:
+        return
+    arrays["order"] = mapping[arrays["order"]]
+    save_arrays(key, bound_name(target, s, bound, mode), **arrays)
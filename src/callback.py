@@ -1,38 +1,211 @@
-import networkx as nx
+import time
+import functools
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
-
-
-# This function is an implementation of Algorithm 1 from "Thinning out Steiner trees:
-# a node-based model for uniform edge costs"
-def find_fischetti_separator(DG, component, b):
-    # Find component boundary
-    neighbors_component = list(nx.node_boundary(DG, component, None))
-
-    # Start Breadth-First Search (BFS)
-    visited = [False for i in DG.nodes]
-    visited[b] = True
-    child = [b]
-
-    while child:
-        # Child becomes the parent
-        parent = child
-
-        # Search for new children
-        child = []
-        for i in parent:
-            if i not in neighbors_component:
-                for j in DG.neighbors(i):
-                    if not visited[j]:
-                        child.append(j)
-                        visited[j] = True
-
-    C = [i for i in neighbors_component if visited[i]]
-
-    return C
+from power import truncated_bfs
+from separator import SeparatorEngine
+from cutpool import CutPool
+import budget
+
+# User cuts are separated on the fractional solutions of the first CUT_NODES nodes of the branch-and-bound
+# tree (1: the root node only, 0: never), in at most CUT_ROUNDS rounds per node
+CUT_NODES = 1
+CUT_ROUNDS = 10
+
+# A fractional solution must violate a cut by more than CUT_VIOLATION for it to be added
+CUT_VIOLATION = 0.1
+
+# Thresholds on x below which vertices are taken out of the support graph when looking for far pairs
+CUT_LEVELS = [1e-6, 0.1, 0.25]
+
+# Maximum number of user cuts added per label and round
+CUT_LIMIT = 50
+
+
+# Attach the graph data shared by the callbacks to the model m: the CSR adjacency of G and its distance
+# index (both read-only), and scratch vertex masks that the callbacks set and reset instead of copying G
+# or changing its edge attributes. The cut_* arguments are the limits of the fractional separation, and
+# pool is the cut pool of the component (a new one by default)
+def attach_graph(m, G, s, dist_index, cut_nodes=CUT_NODES, cut_rounds=CUT_ROUNDS, cut_violation=CUT_VIOLATION,
+                 pool=None):
+    m._graph = G
+    m._s = s
+    m._dist = dist_index
+    m._indptr = dist_index.indptr
+    m._indices = dist_index.indices
+    m._separator = SeparatorEngine(dist_index)
+    # outside[v] is False exactly for the vertices of the cluster being checked
+    m._outside = np.ones(dist_index.n, dtype=bool)
+    m._cut_nodes = cut_nodes
+    m._cut_rounds = cut_rounds
+    m._cut_violation = cut_violation
+    # Node of the branch-and-bound tree being separated, and the rounds of user cuts done there
+    m._cut_node = -1
+    m._cut_round = 0
+    m._pool = CutPool() if pool is None else pool
+    m._pool.reset()
+
+
+# Vertices of the cluster with label j in the current solution, as a sorted array. Variables missing from
+# a sparse model are zero
+def cluster_vertices(G, xval, j):
+    return np.array([vertex for vertex in G.nodes() if xval.get((vertex, j), 0) > 0.5], dtype=np.int64)
+
+
+# Sum of the variables X[c, j] over the vertices c of C, leaving out the ones missing from a sparse model
+def separator_sum(m, C, j):
+    return gp.quicksum(m._X[c, j] for c in C if (c, j) in m._X)
+
+
+# Connected components of G[V_j], each one given as an array of vertices in BFS order
+def cluster_components(m, V_j):
+    outside = m._outside
+    outside[V_j] = False
+    components = []
+    done = set()
+    for v in V_j.tolist():
+        if v in done: continue
+        component, _ = truncated_bfs(m._indptr, m._indices, v, len(V_j), outside)
+        done.update(component.tolist())
+        components.append(component)
+    outside[V_j] = True
+    return components
+
+
+# Pairs (a, b) of vertices of the connected cluster V_j with a < b that are more than s apart in G[V_j]
+def far_pairs(m, V_j):
+    outside = m._outside
+    outside[V_j] = False
+    pairs = []
+    for a in V_j.tolist():
+        reached, _ = truncated_bfs(m._indptr, m._indices, a, m._s, outside)
+        pairs.extend((a, b) for b in np.setdiff1d(V_j[V_j > a], reached).tolist())
+    outside[V_j] = True
+    return pairs
+
+
+# Pairs (a, b) separating the components of a disconnected cluster, together with a minimal length-s
+# a,b-separator minC for each: b is the given vertex and a is taken in every component not containing b
+def component_cuts(m, components, b):
+    for component in components:
+        # If the component doesn't contain b, take a node as a
+        if b in component: continue
+        a = int(component[0])
+        yield a, b, m._separator.component_cut(component, a, b)
+
+
+# Pairs (a, b) more than s apart in the connected cluster G[V_j], together with a minimal length-s
+# a,b-separator minC for each: V \ V_j minimalized to the vertices on short a,b-paths, then minimalized further
+def diameter_cuts(m, V_j):
+    pairs = far_pairs(m, V_j)
+    m._outside[V_j] = False
+    cuts = [(a, b, m._separator.interval_cut(a, b, m._outside)) for a, b in pairs]
+    m._outside[V_j] = True
+    return cuts
+
+
+# Violated pairs (a, b) of the cluster V_j with their minimal length-s a,b-separators. If G[V_j] is
+# disconnected, b is a vertex of the smallest component
+def violated_cuts(m, V_j):
+    components = cluster_components(m, V_j)
+    if len(components) > 1:
+        return component_cuts(m, components, int(min(components, key=len)[0]))
+    return diameter_cuts(m, V_j)
+
+
+# Whether to separate user cuts in this MIPNODE callback: the relaxation of the node is solved to
+# optimality, the node is among the first m._cut_nodes ones and it has rounds left. Counts the round
+def separate_node(m):
+    if m.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+        return False
+    node = int(m.cbGet(GRB.Callback.MIPNODE_NODCNT))
+    if node >= m._cut_nodes:
+        return False
+    if node != m._cut_node:
+        m._cut_node, m._cut_round = node, 0
+    if m._cut_round >= m._cut_rounds:
+        return False
+    m._cut_round += 1
+    return True
+
+
+# Values of the label j in the fractional solution xval, as an array over the vertices
+def label_values(G, xval, j):
+    return np.array([xval.get((vertex, j), 0) for vertex in G.nodes()])
+
+
+# Entries of a sparse solution xval (a dict (v, j) -> value) above threshold, grouped by label in a single
+# pass: a dict j -> (sorted array of the vertices v, array of their values)
+def label_groups(xval, threshold):
+    entries = [(v, j, value) for (v, j), value in xval.items() if value > threshold]
+    if not entries:
+        return {}
+    v, j, value = (np.array(column) for column in zip(*entries))
+    order = np.lexsort((v, j))
+    v, j, value = v[order].astype(np.int64), j[order], value[order]
+    starts = np.flatnonzero(np.r_[True, j[1:] != j[:-1]])
+    ends = np.r_[starts[1:], len(j)]
+    return {int(j[start]): (v[start:end], value[start:end]) for start, end in zip(starts, ends)}
+
+
+# Pairs (a, b) whose cut x[a] + x[b] <= rhs + sum of x[c] over a minimal length-s a,b-separator minC
+# is violated by more than m._cut_violation by the fractional values x of a label, together with minC.
+# For every level of CUT_LEVELS, the vertices with x above it form the support graph: if a and b are more
+# than s apart in the support graph, the other vertices on short a,b-paths form a length-s a,b-separator of
+# small weight. The pairs are searched from the vertices a of largest x, taking for each the vertex b of
+# largest x out of reach, and the levels are tried until one gives cuts
+def fractional_cuts(m, x, rhs):
+    violation = m._cut_violation
+    order = np.argsort(-x, kind="stable")
+    # a pair is only violated if x[a] + x[b] > rhs + violation, with x[a] >= x[b]
+    candidates = order[x[order] > (rhs + violation) / 2].tolist()
+    cuts = []
+    for level in CUT_LEVELS:
+        outside = x <= level
+        seen = set()
+        for a in candidates:
+            if outside[a]: continue
+            partners = ~outside & (x > rhs + violation - x[a])
+            partners[a] = False
+            if not partners.any(): continue
+            reached, _ = truncated_bfs(m._indptr, m._indices, a, m._s, outside)
+            partners[reached] = False
+            far = np.flatnonzero(partners)
+            if not len(far): continue
+            b = int(far[np.argmax(x[far])])
+            if (min(a, b), max(a, b)) in seen: continue
+            seen.add((min(a, b), max(a, b)))
+            minC = m._separator.interval_cut(a, b, outside)
+            if x[a] + x[b] - rhs - x[minC].sum() > violation:
+                cuts.append((a, b, minC))
+                if len(cuts) >= CUT_LIMIT: break
+        if cuts: break
+    return cuts
+
+
+# Stop the solve once its instance is closed (see budget.py)
+def stop_callback(m, where):
+    if budget.stopped():
+        m.terminate()
+
+
+# Count the time spent in the callback as separation time of the cut pool of the model, and stop the solve
+# once its instance is closed
+def timed(cut_callback):
+    @functools.wraps(cut_callback)
+    def timed_callback(m, where):
+        if budget.stopped():
+            m.terminate()
+            return
+        start = time.time()
+        cut_callback(m, where)
+        m._pool.time += time.time() - start
+    return timed_callback
 
 
 # Implementation of Algorithm 1 (Section 2.3)
+@timed
 def labeling_callback(m, where):
     if where == GRB.Callback.MIPSOL:
         # Get the variables
@@ -41,131 +214,39 @@ def labeling_callback(m, where):
 
         # Retrieve parameters
         G = m._graph
-        s = m._s
         k = m._k
 
-        # Find the directed graph of G (DG) to use at Fischetti's Algorithm
-        DG = G.to_directed()
-
         for j in range(k):
             # If the j is not a cluster
             if yval[j] < 0.5: continue
 
             # Nodes linked on club j
-            V_j = [vertex for vertex in G.nodes() if xval[vertex, j] > 0.5]
-            if not V_j: continue  # If it's empty
-
-            # Induced subgraph DG[V_j]
-            subgraph_j = DG.subgraph(V_j)
-
-            # Check if the number of components of subgraph_j is more than one
-            if not nx.is_strongly_connected(subgraph_j):
-                # Select the smallest connected component
-                smallest = min(nx.strongly_connected_components(subgraph_j), key=len)
-
-                # Take a node as b
-                b = list(smallest)[0]
-
-                # For each connected component
-                for component in nx.strongly_connected_components(subgraph_j):
-                    # If the component doesn't contain b
-                    if b in component: continue
+            V_j = cluster_vertices(G, xval, j)
+            if not len(V_j): continue  # If it's empty
 
-                    # Take a node as a
-                    a = list(component)[0]
-
-                    # Get minimal a,b-separator
-                    C = find_fischetti_separator(DG, component, b)
-                    drop_from_C = []
-
-                    # Starts making it a minimal *length-s* a,b-separator
-                    for (u, v) in DG.edges():
-                        DG[u][v]['separator-weight'] = 1
-
-                    # "Remove" C from graph
-                    for c in C:
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = s + 1
-
-                    # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                    for c in C:
-                        # Temporarily add c back to graph (i.e., "remove" c from cut C)
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = 1
-
-                        # What is distance from a to b in G-C?
-                        distance_from_a = nx.single_source_dijkstra_path_length(DG, a, weight='separator-weight')
-
-                        if distance_from_a[b] > s:
-                            # Delete c from C. It was not needed in the cut C
-                            drop_from_C.append(c)
-                        else:
-                            # Keep c in C. Revert arc weights back to "infinity"
-                            for node in DG.neighbors(c):
-                                DG[c][node]['separator-weight'] = s + 1
+            # If G[V_j] is connected with diameter bounded by s, there is no cut and everything is ok
+            for a, b, minC in violated_cuts(m, V_j):
+                # Add lazy cut constraints - (3.d)
+                if m._pool.add(a, b, minC, j, lazy=True):
+                    m.cbLazy(m._X[a, j] + m._X[b, j] <= m._Y[j] + gp.quicksum(m._X[c, j] for c in minC))
 
-                    minC = [c for c in C if c not in drop_from_C]
+    elif where == GRB.Callback.MIPNODE and separate_node(m):
+        # Get the fractional values of the variables
+        xval = m.cbGetNodeRel(m._X)
+        yval = m.cbGetNodeRel(m._Y)
 
-                    # Add lazy cut constraints - (3.d)
-                    m.cbLazy(m._X[a, j] + m._X[b, j] <= m._Y[j] + gp.quicksum(m._X[c, j] for c in minC))
+        for j in range(m._k):
+            # The cuts of label j are violated by at most Y[j], since X[v, j] <= Y[j]
+            if yval[j] <= m._cut_violation: continue
 
-            else:
-                # Induced subgraph G[V_b]
-                G_j = G.subgraph(V_j)
-
-                # If diameter is bounded by s, everything is ok
-                if nx.diameter(G_j) <= s: continue
-
-                # We first minimalize V \ V_j. Start with S' = V \ V_j.
-                S_prime = list(set(G.nodes) - set(V_j))
-                for a in V_j:
-                    distance_from_a = nx.single_source_dijkstra_path_length(G_j, a)
-                    for vertex in distance_from_a:
-                        b = vertex
-                        if a < b and distance_from_a[b] > s:
-                            distance_from_a_in_G = nx.single_source_dijkstra_path_length(G, a)
-                            distance_from_b_in_G = nx.single_source_dijkstra_path_length(G, b)
-                            remove_from_S_prime = []
-                            for v in S_prime:
-                                if distance_from_a_in_G[v] + distance_from_b_in_G[v] > s:
-                                    remove_from_S_prime.append(v)
-                            minimal_S_prime = [node for node in S_prime if node not in remove_from_S_prime]
-
-                            # Now we define C as a length-s a,b separator and we minimalize it
-                            C = minimal_S_prime
-                            remove_from_C = []
-
-                            for u, v in G.edges():
-                                G[u][v]['sep-weight'] = 1
-
-                            # "Remove" C from graph
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = s + 1
-
-                            # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = 1
-
-                                # What is distance from a to b in G-C?
-                                distance_from_a = nx.single_source_dijkstra_path_length(G, a, weight='sep-weight')
-
-                                if distance_from_a[b] > s:
-                                    # Delete c from C. It was not needed in the cut C
-                                    remove_from_C.append(c)
-                                else:
-                                    # Keep c in C. Revert arc weights back to "infinity"
-                                    for neighbor in G.neighbors(c):
-                                        G[c][neighbor]['sep-weight'] = s + 1
-
-                            minC = [c for c in C if c not in remove_from_C]
-
-                            # Add lazy cut constraints - (3.d)
-                            m.cbLazy(m._X[a, j] + m._X[b, j] <= m._Y[j] + gp.quicksum(m._X[c, j] for c in minC))
+            for a, b, minC in fractional_cuts(m, label_values(m._graph, xval, j), yval[j]):
+                # Add user cuts - (3.d)
+                if m._pool.add(a, b, minC, j):
+                    m.cbCut(m._X[a, j] + m._X[b, j] <= m._Y[j] + gp.quicksum(m._X[c, j] for c in minC))
 
 
 # Input restrictions on labeling_callback function
+@timed
 def restricted_labeling_callback(m, where):
     if where == GRB.Callback.MIPSOL:
         # Get the variables
@@ -173,128 +254,31 @@ def restricted_labeling_callback(m, where):
 
         # Retrieve parameters
         G = m._graph
-        s = m._s
         k = m._k
 
-        # Find the directed graph of G (DG) to use at Fischetti's Algorithm
-        DG = G.to_directed()
-
         for j in range(k):
             # Nodes linked on club j
-            V_j = [vertex for vertex in G.nodes() if xval[vertex, j] > 0.5]
-            if not V_j: continue  # If it's empty
-
-            # Induced subgraph DG[V_j]
-            subgraph_j = DG.subgraph(V_j)
-
-            # Check if the number of components of subgraph_j is more than one
-            if not nx.is_strongly_connected(subgraph_j):
-                # Select the smallest connected component
-                smallest = min(nx.strongly_connected_components(subgraph_j), key=len)
+            V_j = cluster_vertices(G, xval, j)
+            if not len(V_j): continue  # If it's empty
 
-                # Take a node as b
-                b = list(smallest)[0]
-
-                # For each connected component
-                for component in nx.strongly_connected_components(subgraph_j):
-                    # If the component doesn't contain b
-                    if b in component: continue
-
-                    # Take a node as a
-                    a = list(component)[0]
-
-                    # Get minimal a,b-separator
-                    C = find_fischetti_separator(DG, component, b)
-
-                    # Make it a minimal *length-s* a,b-separator
-                    for (u, v) in DG.edges():
-                        DG[u][v]['separator-weight'] = 1
-
-                    # "Remove" C from graph
-                    for c in C:
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = s + 1
-
-                            # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                    drop_from_C = []
-                    for c in C:
-                        # Temporarily add c back to graph (i.e., "remove" c from cut C)
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = 1
-
-                        # What is distance from a to b in G-C?
-                        distance_from_a = nx.single_source_dijkstra_path_length(DG, a, weight='separator-weight')
-
-                        if distance_from_a[b] > s:
-                            # Delete c from C. It was not needed in the cut C.
-                            drop_from_C.append(c)
-                        else:
-                            # Keep c in C. revert arc weights back to "infinity"
-                            for node in DG.neighbors(c):
-                                DG[c][node]['separator-weight'] = s + 1
-
-                    minC = [c for c in C if c not in drop_from_C]
-
-                    # Add lazy cut constraints - (3.d)
+            for a, b, minC in violated_cuts(m, V_j):
+                # Add lazy cut constraints - (3.d)
+                if m._pool.add(a, b, minC, j, lazy=True):
                     m.cbLazy(m._X[a, j] + m._X[b, j] <= 1 + gp.quicksum(m._X[c, j] for c in minC))
 
-            else:
-                # Induced subgraph G[V_b]
-                G_j = G.subgraph(V_j)
-
-                # If diameter is bounded by s, everything is ok
-                if nx.diameter(G_j) <= s: continue
-
-                # We first minimalize V \ V_j. Start with S' = V \ V_j.
-                S_prime = list(set(G.nodes) - set(V_j))
-                for a in V_j:
-                    distance_from_a = nx.single_source_dijkstra_path_length(G_j, a)
-                    for vertex in distance_from_a:
-                        b = vertex
-                        if a < b and distance_from_a[b] > s:
-                            distance_from_a_in_G = nx.single_source_dijkstra_path_length(G, a)
-                            distance_from_b_in_G = nx.single_source_dijkstra_path_length(G, b)
-                            remove_from_S_prime = []
-                            for v in S_prime:
-                                if distance_from_a_in_G[v] + distance_from_b_in_G[v] > s:
-                                    remove_from_S_prime.append(v)
-                            minimal_S_prime = [node for node in S_prime if node not in remove_from_S_prime]
-
-                            # Now we define C as a length-s a,b separator and we minimalize it
-                            C = minimal_S_prime
-                            remove_from_C = []
-
-                            for u, v in G.edges():
-                                G[u][v]['sep-weight'] = 1
-
-                            # "Remove" C from graph
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = s + 1
-
-                            # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = 1
-
-                                # What is distance from a to b in G-C?
-                                distance_from_a = nx.single_source_dijkstra_path_length(G, a, weight='sep-weight')
-
-                                if distance_from_a[b] > s:
-                                    # Delete c from C. It was not needed in the cut C
-                                    remove_from_C.append(c)
-                                else:
-                                    # Keep c in C. Revert arc weights back to "infinity"
-                                    for neighbor in G.neighbors(c):
-                                        G[c][neighbor]['sep-weight'] = s + 1
-
-                            minC = [c for c in C if c not in remove_from_C]
-
-                            # Add lazy cut constraints - (3.d)
-                            m.cbLazy(m._X[a, j] + m._X[b, j] <= 1 + gp.quicksum(m._X[c, j] for c in minC))
+    elif where == GRB.Callback.MIPNODE and separate_node(m):
+        # Get the fractional values of the variables
+        xval = m.cbGetNodeRel(m._X)
+
+        for j in range(m._k):
+            for a, b, minC in fractional_cuts(m, label_values(m._graph, xval, j), 1):
+                # Add user cuts - (3.d)
+                if m._pool.add(a, b, minC, j):
+                    m.cbCut(m._X[a, j] + m._X[b, j] <= 1 + gp.quicksum(m._X[c, j] for c in minC))
 
 
 # Implementation of Algorithm 1 (Section 2.3)
+@timed
 def centering_callback(m, where):
     if where == GRB.Callback.MIPSOL:
         # Get the variables
@@ -302,240 +286,74 @@ def centering_callback(m, where):
 
         # Retrieve parameters
         G = m._graph
-        s = m._s
-
-        # Find the directed graph of G (DG) to use at Fischetti's Algorithm
-        DG = G.to_directed()
 
         for b in G.nodes:
             # If the b is not a center
             if xval[b, b] < 0.5: continue
 
             # Nodes linked to center b
-            V_b = [vertex for vertex in G.nodes if xval[vertex, b] > 0.5]
-            if not V_b: continue  # If it's empty
-
-            # Induced subgraph DG[V_b]
-            subgraph_b = DG.subgraph(V_b)
-
-            # Check if the number of components of subgraph_b is more than one
-            if not nx.is_strongly_connected(subgraph_b):
-                # For each connected component
-                for component in nx.strongly_connected_components(subgraph_b):
-                    # If the component doesn't contain b
-                    if b in component: continue
-
-                    # Take a node as a
-                    a = list(component)[0]
-
-                    # Get minimal a,b-separator
-                    C = find_fischetti_separator(DG, component, b)
-                    drop_from_C = []
-
-                    # Starts making it a minimal *length-s* a,b-separator
-                    for (u, v) in DG.edges():
-                        DG[u][v]['separator-weight'] = 1
-
-                    # "Remove" C from graph
-                    for c in C:
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = s + 1
-
-                    # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                    for c in C:
-                        # Temporarily add c back to graph (i.e., "remove" c from cut C)
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = 1
-
-                        # What is distance from a to b in G-C?
-                        distance_from_a = nx.single_source_dijkstra_path_length(DG, a, weight='separator-weight')
-
-                        if distance_from_a[b] > s:
-                            # Delete c from C. It was not needed in the cut C
-                            drop_from_C.append(c)
-                        else:
-                            # Keep c in C. Revert arc weights back to "infinity"
-                            for node in DG.neighbors(c):
-                                DG[c][node]['separator-weight'] = s + 1
-
-                    minC = [c for c in C if c not in drop_from_C]
+            V_b = cluster_vertices(G, xval, b)
+            if not len(V_b): continue  # If it's empty
 
+            # Check if the number of components of G[V_b] is more than one
+            components = cluster_components(m, V_b)
+            if len(components) > 1:
+                for a, _, minC in component_cuts(m, components, b):
                     # Add lazy cut constraints - (5.c)
-                    m.cbLazy(m._X[a, b] <= gp.quicksum(m._X[c, b] for c in minC))
+                    if m._pool.add(a, b, minC, b, lazy=True):
+                        m.cbLazy(m._X[a, b] <= separator_sum(m, minC, b))
 
             else:
-                # Induced subgraph G[V_b]
-                G_b = G.subgraph(V_b)
-
-                # If diameter is bounded by s, everything is ok
-                if nx.diameter(G_b) <= s: continue
-
-                # We first minimalize V \ V_b. Start with S' = V \ V_b.
-                S_prime = [i for i in G.nodes if i not in V_b]
-                for u in V_b:
-                    distance_from_u = nx.single_source_dijkstra_path_length(G_b, u)
-                    for v in distance_from_u:
-                        if u < v and distance_from_u[v] > s:
-                            distance_from_u_in_G = nx.single_source_dijkstra_path_length(G, u)
-                            distance_from_v_in_G = nx.single_source_dijkstra_path_length(G, v)
-                            remove_from_S_prime = []
-                            for vertex in S_prime:
-                                if distance_from_u_in_G[vertex] + distance_from_v_in_G[vertex] > s:
-                                    remove_from_S_prime.append(vertex)
-                            minimal_S_prime = [node for node in S_prime if node not in remove_from_S_prime]
-
-                            # Now we define C as a length-s a,b separator and we minimalize it
-                            C = minimal_S_prime
-                            remove_from_C = []
-
-                            # Starts making it a minimal
-                            for p, q in G.edges():
-                                G[p][q]['sep-weight'] = 1
-
-                            # "Remove" C from graph
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = s + 1
-
-                            # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                            for c in C:
-                                # Temporarily add c back to graph (i.e., "remove" c from cut C)
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = 1
-
-                                # What is distance from u to v in G-C?
-                                distance_from_u = nx.single_source_dijkstra_path_length(G, u, weight='sep-weight')
-
-                                if distance_from_u[v] > s:
-                                    # Delete c from C. It was not needed in the cut C
-                                    remove_from_C.append(c)
-                                else:
-                                    # Keep c in C. Revert arc weights back to "infinity"
-                                    for neighbor in G.neighbors(c):
-                                        G[c][neighbor]['sep-weight'] = s + 1
-
-                            minC = [c for c in C if c not in remove_from_C]
-
-                            # Add lazy cut constraints - (5.c)
-                            m.cbLazy(m._X[u, b] + m._X[v, b] <= m._X[b, b] + gp.quicksum(m._X[c, b] for c in minC))
+                # If diameter is bounded by s, there is no pair and everything is ok
+                for u, v, minC in diameter_cuts(m, V_b):
+                    # Add lazy cut constraints - (5.c)
+                    if m._pool.add(u, v, minC, b, lazy=True):
+                        m.cbLazy(m._X[u, b] + m._X[v, b] <= m._X[b, b] + separator_sum(m, minC, b))
+
+    elif where == GRB.Callback.MIPNODE and separate_node(m):
+        # Get the fractional values of the variables
+        xval = m.cbGetNodeRel(m._X)
+
+        for b in m._graph.nodes:
+            # The cuts of center b are violated by at most X[b, b]
+            if xval[b, b] <= m._cut_violation: continue
+
+            for u, v, minC in fractional_cuts(m, label_values(m._graph, xval, b), xval[b, b]):
+                # Add user cuts - (5.c)
+                if m._pool.add(u, v, minC, b):
+                    m.cbCut(m._X[u, b] + m._X[v, b] <= m._X[b, b] + separator_sum(m, minC, b))
 
 
 # Implementation of Benders Approach
+@timed
 def benders_callback(m, where):
     if where == GRB.Callback.MIPSOL:
         # Retrieve partial solutions
         xval = m.cbGetSolution(m._X)
+        yval = m.cbGetSolution(m._Y)
 
-        # Retrieve parameters
-        T_star = m._T_star
-        s = m._s
-        G = m._graph
-
-        # Find the directed graph of G (DG) to use at Fischetti's Algorithm
-        DG = G.to_directed()
-
-        for j in T_star:
-            # Nodes assigned to j
-            V_j = [vertex for vertex in G.nodes() if xval[vertex, j] > 0.5]
-
-            # If not empty
-            if not V_j: continue
-
-            # Take the subgrapgh
-            subgraph_j = DG.subgraph(V_j)
-
-            # Check if the number of components of subgraph_j is more than one
-            if not nx.is_strongly_connected(subgraph_j):
-                # Choose a vertex at the smallest component
-                smallest = min(nx.strongly_connected_components(subgraph_j), key=len)
-                b = list(smallest)[0]
-
-                # For each component
-                for component in nx.strongly_connected_components(subgraph_j):
-                    if b in component: continue
-
-                    # Take a node at the component
-                    a = list(component)[0]
-
-                    # Get minimal a,b-separator
-                    C = find_fischetti_separator(DG, component, b)
-
-                    # Make it a minimal *length-s* a,b-separator
-                    for (u, v) in DG.edges():
-                        DG[u][v]['separator-weight'] = 1
-
-                    # "Remove" C from graph
-                    for c in C:
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = s + 1
-
-                            # Is C\{c} a length-s a,b-separator still? If so, remove c from C
-                    drop_from_C = []
-                    for c in C:
-                        # Temporarily add c back to graph (i.e., "remove" c from cut C)
-                        for node in DG.neighbors(c):
-                            DG[c][node]['separator-weight'] = 1
-
-                        # What is distance from a to b in G-C ?
-                        distance_from_a = nx.single_source_dijkstra_path_length(DG, a, weight='separator-weight')
-
-                        # If c was not needed in cut C
-                        if distance_from_a[b] > s:
-                            # Delete c from C
-                            drop_from_C.append(c)
-                        else:
-                            # Keep c in C. Revert arc weights back to "infinity"
-                            for node in DG.neighbors(c):
-                                DG[c][node]['separator-weight'] = s + 1
-
-                                # Add lazy cut
-                    minC = [c for c in C if c not in drop_from_C]
-                    m.cbLazy(m._X[a, j] + m._X[b, j] <= 1 + gp.quicksum(m._X[c, j] for c in minC))
+        # Nodes assigned to every open cluster j, from the nonzero assignments only
+        for j, (V_j, _) in label_groups(xval, 0.5).items():
+            if yval[j] < 0.5: continue
 
-            else:
-                # Take G subgraph
-                G_j = G.subgraph(V_j)
-
-                # If the diameter is less than s, it is a s-club
-                if nx.diameter(G_j) <= s: continue
-
-                # We first minimalize V \ V_j. Start with S' = V \ V_j.
-                S_prime = list(set(G.nodes) - set(V_j))
-                for a in V_j:
-                    distance_from_a = nx.single_source_dijkstra_path_length(G_j, a)
-                    for vertex in distance_from_a:
-                        b = vertex
-                        if a < b and distance_from_a[b] > s:
-                            distance_from_a_in_G = nx.single_source_dijkstra_path_length(G, a)
-                            distance_from_b_in_G = nx.single_source_dijkstra_path_length(G, b)
-                            remove_from_S_prime = []
-                            for v in S_prime:
-                                if distance_from_a_in_G[v] + distance_from_b_in_G[v] > s:
-                                    remove_from_S_prime.append(v)
-                            minimal_S_prime = [node for node in S_prime if node not in remove_from_S_prime]
-
-                            # Now we define C as a length-s a,b separator and we minimalize it
-                            C = minimal_S_prime
-                            remove_from_C = []
-
-                            for u, v in G.edges():
-                                G[u][v]['sep-weight'] = 1
-
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = s + 1
-
-                            for c in C:
-                                for neighbor in G.neighbors(c):
-                                    G[c][neighbor]['sep-weight'] = 1
-
-                                distance_from_a = nx.single_source_dijkstra_path_length(G, a, weight='sep-weight')
-
-                                if distance_from_a[b] > s:
-                                    remove_from_C.append(c)
-                                else:
-                                    for neighbor in G.neighbors(c):
-                                        G[c][neighbor]['sep-weight'] = s + 1
-
-                            minC = [c for c in C if c not in remove_from_C]
-                            m.cbLazy(m._X[a, j] + m._X[b, j] <= 1 + gp.quicksum(m._X[c, j] for c in minC))
+            # If G[V_j] is connected with diameter bounded by s, it is a s-club
+            for a, b, minC in violated_cuts(m, V_j):
+                # Add lazy cut
+                if m._pool.add(a, b, minC, j, lazy=True):
+                    m.cbLazy(m._X[a, j] + m._X[b, j] <= 1 + separator_sum(m, minC, j))
+
+    elif where == GRB.Callback.MIPNODE and separate_node(m):
+        # Get the fractional values of the variables
+        xval = m.cbGetNodeRel(m._X)
+        yval = m.cbGetNodeRel(m._Y)
+
+        for j, (vertices, values) in label_groups(xval, 0).items():
+            # As X[v, j] <= Y[j], the cuts of cluster j are violated by at most 2 Y[j] - 1
+            if 2 * yval[j] - 1 <= m._cut_violation: continue
+
+            x = np.zeros(m._dist.n)
+            x[vertices] = values
+            for a, b, minC in fractional_cuts(m, x, 1):
+                # Add user cuts
+                if m._pool.add(a, b, minC, j):
+                    m.cbCut(m._X[a, j] + m._X[b, j] <= 1 + separator_sum(m, minC, j))
@@ -0,0 +1,92 @@
+import numpy as np
+import cache
+
+# Modes of the cut pool: kept on disk across solves of the same component and s (see cache.py), or turned off
+CUT_POOL = ["disk", "off"]
+
+# At most this many separators are stored per component and s, the first ones found first
+MAX_POOL_CUTS = 100000
+
+
+# Length-s separators (a, b, C) found by the callbacks on one component: every a,b-path of length at most s
+# meets C. They do not depend on the labels, the problem or the warm start, so the inequalities
+# x[a, j] + x[b, j] <= rhs_j + sum of x[c, j] over C hold for every label j of every solve. The pool also
+# remembers which (separator, label) pairs were added in the current solve, so that duplicates are skipped,
+# and counts the cuts and the separation time
+class CutPool:
+    def __init__(self, separators=()):
+        # Separators by normalized signature (a < b, C sorted), in the order they were found
+        self.separators = dict.fromkeys(separators)
+        self.loaded = len(self.separators)
+        # (signature, label) pairs added in the current solve, and those among them that are model constraints
+        self.added = set()
+        self.in_model = set()
+        self.separated = 0
+        self.cuts = 0
+        self.duplicates = 0
+        self.preloaded = 0
+        self.time = 0.0
+
+    @staticmethod
+    def signature(a, b, C):
+        return min(a, b), max(a, b), tuple(sorted(C))
+
+    # Start a new solve: forget the cuts added to the previous model
+    def reset(self):
+        self.added = set()
+        self.in_model = set()
+
+    # Record the cut of the separator (a, b, C) for the label j and return whether to add it: user cuts are
+    # added once per solve. A lazy cut separated again is added again (the solution at hand may have been found
+    # before the first one reached it), unless it is a constraint of the model
+    def add(self, a, b, C, j, lazy=False):
+        key = self.signature(a, b, C)
+        self.separated += 1
+        self.separators.setdefault(key)
+        if (key, j) in self.added:
+            self.duplicates += 1
+            if not lazy or (key, j) in self.in_model:
+                return False
+        self.added.add((key, j))
+        self.cuts += 1
+        return True
+
+    # Record the cut of the separator with signature key for the label j as a constraint added at model build
+    def preload(self, key, j):
+        self.added.add((key, j))
+        self.in_model.add((key, j))
+        self.preloaded += 1
+
+    def hit_rate(self):
+        return self.duplicates / self.separated if self.separated else 0.0
+
+    def summary(self):
+        return ("Cut pool: " + str(len(self.separators)) + " separators, " + str(self.preloaded) +
+                " cuts preloaded, " +
+                str(self.separated) + " separated, " + str(self.cuts) + " added, " +
+                '{0:.1%}'.format(self.hit_rate()) + " duplicates, " + '{0:.2f}'.format(self.time) +
+                " seconds of separation")
+
+    # Pool of the component of the graph with cache key key, preloaded with the separators stored on disk
+    @classmethod
+    def load(cls, key, component, s):
+        arrays = cache.load_arrays(key, pool_name(component, s), ("a", "b", "order", "sizes"))
+        if arrays is None:
+            return cls()
+        separators = np.split(arrays["order"], np.cumsum(arrays["sizes"])[:-1]) if len(arrays["sizes"]) else []
+        return cls((int(a), int(b), tuple(C.tolist())) for a, b, C in zip(arrays["a"], arrays["b"], separators))
+
+    # Store the separators of the pool on disk, unless there is nothing new
+    def save(self, key, component, s):
+        if len(self.separators) == self.loaded:
+            return
+        separators = list(self.separators)[:MAX_POOL_CUTS]
+        cache.save_arrays(key, pool_name(component, s),
+                          a=np.array([a for a, _, _ in separators], dtype=np.int64),
+                          b=np.array([b for _, b, _ in separators], dtype=np.int64),
+                          order=np.array([c for _, _, C in separators for c in C], dtype=np.int64),
+                          sizes=np.array([len(C) for _, _, C in separators], dtype=np.int64))
+
+
+def pool_name(component, s):
+    return "_".join(["cuts", "s" + str(s), "c" + str(component)])
@@ -0,0 +1,132 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from power import bounded_distances
+
+# Components up to this many vertices also keep a dense n x n distance matrix
+DENSE_LIMIT = 5000
+
+
+# Build the CSR adjacency (indptr, indices) of G, keeping the adjacency order of networkx.
+# The vertices of G are assumed to be labeled 0, ..., n-1 (see nx.convert_node_labels_to_integers)
+def adjacency_arrays(G):
+    n = G.number_of_nodes()
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    for v in range(n):
+        indptr[v + 1] = indptr[v] + len(G.adj[v])
+    indices = np.fromiter((u for v in range(n) for u in G.adj[v]), dtype=np.int64, count=int(indptr[n]))
+    return indptr, indices
+
+
+# All-pairs distances of one connected component, truncated at depth s. Every pair farther than s
+# apart gets the distance s + 1. The distances are stored row by row as a sparse "ball" structure
+# (for every vertex the vertices within distance s, sorted by label) and, for small components,
+# also as a dense uint8/uint16 matrix.
+class DistanceIndex:
+    def __init__(self, indptr, indices, s, ball_indptr, ball_indices, ball_dist):
+        self.n = len(indptr) - 1
+        self.s = s
+        self.far = s + 1
+        self.indptr = indptr
+        self.indices = indices
+        self.ball_indptr = ball_indptr
+        self.ball_indices = ball_indices
+        self.ball_dist = ball_dist
+        self._matrix = None
+
+    # Dense distance matrix, built on first use for components with at most DENSE_LIMIT vertices
+    @property
+    def matrix(self):
+        if self._matrix is None and self.n <= DENSE_LIMIT:
+            self._matrix = np.full((self.n, self.n), self.far, dtype=self.ball_dist.dtype)
+            rows = np.repeat(np.arange(self.n), np.diff(self.ball_indptr))
+            self._matrix[rows, self.ball_indices] = self.ball_dist
+        return self._matrix
+
+    # Build the index of G
+    @classmethod
+    def from_graph(cls, G, s):
+        indptr, indices = adjacency_arrays(G)
+        return cls.from_arrays(indptr, indices, s)
+
+    # Build the index of the graph with CSR adjacency (indptr, indices)
+    @classmethod
+    def from_arrays(cls, indptr, indices, s):
+        dtype = np.uint8 if s + 1 <= np.iinfo(np.uint8).max else np.uint16
+        ball_indptr, ball_indices, ball_dist = bounded_distances(indptr, indices, s, dtype)
+        return cls(indptr, indices, s, ball_indptr, ball_indices, ball_dist)
+
+    # Neighbors of v in G
+    def neighbors(self, v):
+        return self.indices[self.indptr[v]:self.indptr[v + 1]]
+
+    # Distance between u and v (s + 1 if they are farther than s apart)
+    def dist(self, u, v):
+        if self.matrix is not None:
+            return int(self.matrix[u, v])
+        row = self.ball_indices[self.ball_indptr[u]:self.ball_indptr[u + 1]]
+        position = np.searchsorted(row, v)
+        if position < len(row) and row[position] == v:
+            return int(self.ball_dist[self.ball_indptr[u] + position])
+        return self.far
+
+    # Distances from v to every vertex as an array of length n
+    def distances_from(self, v):
+        if self.matrix is not None:
+            return self.matrix[v]
+        row = np.full(self.n, self.far, dtype=self.ball_dist.dtype)
+        start, end = self.ball_indptr[v], self.ball_indptr[v + 1]
+        row[self.ball_indices[start:end]] = self.ball_dist[start:end]
+        return row
+
+    # Distances between the vertices u[i] and v[i] for arrays u and v (s + 1 if they are farther than s apart)
+    def pair_dist(self, u, v):
+        if self.matrix is not None:
+            return self.matrix[u, v]
+        # The entries of the balls sorted by (row, vertex) have the sorted keys row * n + vertex
+        keys = np.repeat(np.arange(self.n, dtype=np.int64), np.diff(self.ball_indptr)) * self.n + self.ball_indices
+        wanted = np.asarray(u, dtype=np.int64) * self.n + v
+        position = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        return np.where(keys[position] == wanted, self.ball_dist[position], self.far).astype(self.ball_dist.dtype)
+
+    # Closed ball of radius r <= s around v, i.e., the vertices at distance at most r from v
+    def ball(self, v, r):
+        start, end = self.ball_indptr[v], self.ball_indptr[v + 1]
+        return self.ball_indices[start:end][self.ball_dist[start:end] <= r]
+
+    # Neighbors of v in the r-th power graph of G
+    def power_neighbors(self, v, r):
+        start, end = self.ball_indptr[v], self.ball_indptr[v + 1]
+        dist = self.ball_dist[start:end]
+        return self.ball_indices[start:end][(dist <= r) & (dist > 0)]
+
+    # Closed neighborhood of a vertex set in the r-th power graph of G
+    def ball_of_set(self, vertices, r):
+        return np.unique(np.concatenate([self.ball(v, r) for v in vertices]))
+
+    # Vertices w with dist(u, w) + dist(w, v) <= r <= s, i.e., the vertices on some u,v-path of length at most r
+    def interval(self, u, v, r):
+        start_u, end_u = self.ball_indptr[u], self.ball_indptr[u + 1]
+        start_v, end_v = self.ball_indptr[v], self.ball_indptr[v + 1]
+        common, from_u, from_v = np.intersect1d(self.ball_indices[start_u:end_u], self.ball_indices[start_v:end_v],
+                                                assume_unique=True, return_indices=True)
+        total = self.ball_dist[start_u:end_u][from_u].astype(np.int64) + self.ball_dist[start_v:end_v][from_v]
+        return common[total <= r]
+
+    # Closed balls of radius r around all the vertices as a CSR structure (indptr, indices)
+    def balls(self, r):
+        if r >= self.s:
+            return self.ball_indptr, self.ball_indices
+        keep = self.ball_dist <= r
+        rows = np.repeat(np.arange(self.n), np.diff(self.ball_indptr))[keep]
+        indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.n), out=indptr[1:])
+        return indptr, self.ball_indices[keep]
+
+    # Adjacency matrix of the r-th power graph of G (without the diagonal) as a boolean CSR matrix
+    def power_adjacency(self, r):
+        keep = (self.ball_dist <= r) & (self.ball_dist > 0)
+        rows = np.repeat(np.arange(self.n), np.diff(self.ball_indptr))[keep]
+        indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.n), out=indptr[1:])
+        return csr_matrix((np.ones(len(rows), dtype=bool), self.ball_indices[keep], indptr),
+                          shape=(self.n, self.n))
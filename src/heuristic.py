@@ -1,215 +1,361 @@
 import sys
 from check_solution import check_solution
-import gurobipy as gp
-from gurobipy import GRB, LinExpr
+from gurobipy import GRB
 import networkx as nx
-import copy
+import heapq
+import hashlib
+import numpy as np
+from distance import DistanceIndex
+from power import gather_rows
+from scipy.sparse import csr_matrix
+import random
+import session
+
+# Sampling policies of candidate_cliques when the number of candidates is capped
+CLIQUE_SAMPLING = ["first", "largest", "random"]
+
+# Time limit (in seconds) of the IPs of phase I
+TIME_LIMIT = 60
 
 
 # The code in this file corresponds to the upper-bound calculation in section 3
-# When s is even (section 3.1 and section 3.2)
-def calculate_UB_even(G, s, UB_mode, problem):
-    # Creating the s/2 power graph
+# When s is even (section 3.1 and section 3.2). Returns the partitions together with the status of the
+# phase I model (None unless UB_mode is IP), which uses threads Gurobi threads
+def calculate_UB_even(G, s, UB_mode, problem, dist_index=None, time_limit=TIME_LIMIT, threads=None):
+    # Distances up to s/2 define the s/2 power graph H
     r = int(s / 2)
-    H = nx.power(G, r)
+    if dist_index is None:
+        dist_index = DistanceIndex.from_graph(G, r)
+    status = None
 
     if UB_mode == "IP":
         # Phase I (the minimum dominating set problem)
         # Initialize the model
-        m = gp.Model()
-
-        # Add the variables
-        z = m.addVars(H.nodes, vtype=GRB.BINARY)
-
-        # Set the objective function
-        m.setObjective(gp.quicksum(z[i] for i in H.nodes), GRB.MINIMIZE)
+        m = session.model("dominating set", time_limit, threads)
 
-        # Covering constraints
-        m.addConstrs(z[i] + gp.quicksum(z[j] for j in H.neighbors(i)) >= 1 for i in H.nodes)
+        # Add the variables, with the objective function
+        n = dist_index.n
+        z = m.addMVar(n, vtype=GRB.BINARY, obj=1)
+        m.ModelSense = GRB.MINIMIZE
 
-        # Set the parameters
-        m.Params.timeLimit = 60  # 60-second time limit
-        m.Params.method = 3  # Concurrent method
-        m.Params.Presolve = 1
+        # Covering constraints: the rows of the matrix are the closed neighborhoods in the s/2 power graph H
+        ball_indptr, ball_indices = dist_index.balls(r)
+        m.addMConstr(csr_matrix((np.ones(len(ball_indices)), ball_indices, ball_indptr), shape=(n, n)), z,
+                     GRB.GREATER_EQUAL, np.ones(n))
 
         # Optimize the model
         m.optimize()
+        status = m.Status
 
         # Retrieve the solution if solved to optimality and retrieve the best feasible solution if the
         # time limit is reached
-        if m.status == GRB.OPTIMAL or m.status == GRB.TIME_LIMIT:
+        if m.SolCount > 0 and status in [GRB.OPTIMAL, GRB.TIME_LIMIT]:
             # Create the set D
-            D = [j for j in G.nodes if z[j].x > 0.5]
+            D = np.flatnonzero(z.X > 0.5).tolist()
+        elif status == GRB.TIME_LIMIT:
+            # No solution within a short time limit: the greedy algorithm below finds D
+            UB_mode = "APX"
         else:
             print("Unexpected model status from calculate_UB_even")
             sys.exit()
-    elif UB_mode == "APX":
-        U = set(G.nodes())
+        m.dispose()
+    if UB_mode == "APX":
+        # Lazy greedy: gain[v] = |NH[v] ∩ U| is kept up to date as U shrinks, and the heap holds one
+        # entry (-gain, v) per candidate whose gain may be stale (too large). A popped entry whose gain
+        # is current is a vertex of maximum gain, and the smallest such vertex, as in a full rescan
+        ball_indptr, ball_indices = dist_index.balls(r)
+        gain = np.diff(ball_indptr)
+        uncovered = np.ones(len(gain), dtype=bool)
+        remaining = len(gain)
+        heap = [(-int(gain[v]), v) for v in G.nodes]
+        heapq.heapify(heap)
         D = []
-        remaining_vertices = copy.deepcopy(list(G.nodes()))
-        while U:
+        while remaining:
             # Pick a vertex that maximizes |NH[v] ∩ U|
-            best_vertex = None
-            max_intersection_size = -1
-            for v in remaining_vertices:
-                closed_neighborhood = {v}.union(nx.node_boundary(H, {v}))
-                # Compute the intersection with U
-                intersection_size = len(closed_neighborhood.intersection(U))
-                # Keep track of the clique with the maximum intersection
-                if intersection_size > max_intersection_size:
-                    best_vertex = v
-                    max_intersection_size = intersection_size
-            if best_vertex is not None:
-                D.append(best_vertex)
-            remaining_vertices.remove(best_vertex)
-            # Update U by removing all vertices in NH[v] from U
-            closed_neighborhood_best_vertex = {best_vertex}.union(nx.node_boundary(H, {best_vertex}))
-            U.difference_update(closed_neighborhood_best_vertex)
-    else:
+            negative_gain, best_vertex = heapq.heappop(heap)
+            if -negative_gain != gain[best_vertex]:
+                heapq.heappush(heap, (-int(gain[best_vertex]), best_vertex))
+                continue
+            D.append(best_vertex)
+            # Update U by removing all vertices in NH[v] from U, and the gains of the vertices covering them
+            closed_neighborhood = ball_indices[ball_indptr[best_vertex]:ball_indptr[best_vertex + 1]]
+            newly_covered = closed_neighborhood[uncovered[closed_neighborhood]]
+            uncovered[newly_covered] = False
+            remaining -= len(newly_covered)
+            np.subtract.at(gain, gather_rows(ball_indptr, ball_indices, newly_covered), 1)
+    elif UB_mode != "IP":
         print("Invalid UB_mode")
         sys.exit()
-    # Starts the phase II BFS-like assignment to create valid partitions
-    # Copy the graph and perform the BFS on the new copied graph
-    G_new = copy.deepcopy(G)
-    G_new.add_node('r')
-    for i in D:
-        G_new.add_edge('r', i)
-    bfs_tree = nx.bfs_tree(G_new, source='r')
-    # Create the partitions from the BFS tree
-    T_minus_r = bfs_tree.copy()
-    T_minus_r.remove_node('r')
-    T_minus_r_undirected = T_minus_r.to_undirected()
-    partitions = list(nx.connected_components(T_minus_r_undirected))
-    partitions = [list(partition) for partition in partitions]
+    # Starts the phase II BFS-like assignment to create valid partitions:
+    # a multi-source BFS from the vertices of D, each of which seeds its own cluster
+    cluster_id = assign_clusters(dist_index.indptr, dist_index.indices, [[v] for v in D])
+    partitions = clusters_from_labels(cluster_id, len(D))
     # Check the solution
     valid_solution = check_solution(G, s, partitions, problem)
     if valid_solution:
-        return partitions
+        return partitions, status
     else:
         print("The obtained solution from calculate_UB_even is not feasible")
         sys.exit()
 
 
-# When s is odd (section 3.5)
-def calculate_UB_odd(G, s, UB_mode, problem):
-    # Find the diameter and take the power graph
+# Phase II: multi-source BFS over the CSR adjacency (indptr, indices). The vertices of seeds[i] start in
+# cluster i (a vertex listed in several seeds goes to the first one), and every other vertex joins the
+# cluster of the vertex that discovers it. The BFS is level-synchronous and visits the frontier in queue
+# order, so the result is the BFS tree of the graph with a super root attached to the seeds.
+# Returns the array cluster_id of length n
+def assign_clusters(indptr, indices, seeds):
+    n = len(indptr) - 1
+    cluster_id = np.full(n, -1, dtype=np.int64)
+    sizes = [len(seed) for seed in seeds]
+    frontier = np.fromiter((vertex for seed in seeds for vertex in seed), dtype=np.int64, count=sum(sizes))
+    labels = np.repeat(np.arange(len(seeds), dtype=np.int64), sizes)
+    while len(frontier):
+        # Keep the first occurrence of every unlabeled vertex, as a FIFO queue would
+        unlabeled = cluster_id[frontier] < 0
+        frontier, labels = frontier[unlabeled], labels[unlabeled]
+        _, first = np.unique(frontier, return_index=True)
+        first.sort()
+        frontier, labels = frontier[first], labels[first]
+        cluster_id[frontier] = labels
+        # Every vertex of the frontier offers its cluster to its neighbors
+        labels = np.repeat(labels, indptr[frontier + 1] - indptr[frontier])
+        frontier = gather_rows(indptr, indices, frontier)
+    return cluster_id
+
+
+# Vertex lists of the clusters 0, ..., count-1 given by cluster_id (empty clusters are dropped)
+def clusters_from_labels(cluster_id, count):
+    order = np.argsort(cluster_id, kind="stable")
+    sizes = np.bincount(cluster_id, minlength=count)
+    return [cluster.tolist() for cluster in np.split(order, np.cumsum(sizes)[:-1]) if len(cluster)]
+
+
+# Closed neighborhoods NH[Q] of the cliques Q in the power graph H = G^d, as a boolean
+# (#cliques x n) CSR matrix: the product of the clique membership matrix with the balls of radius d
+def clique_coverage(cliques, dist_index, d):
+    n = dist_index.n
+    sizes = np.array([len(clique) for clique in cliques], dtype=np.int64)
+    indptr = np.zeros(len(cliques) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=indptr[1:])
+    members = np.fromiter((vertex for clique in cliques for vertex in clique), dtype=np.int64, count=indptr[-1])
+    membership = csr_matrix((np.ones(len(members), dtype=np.int32), members, indptr), shape=(len(cliques), n))
+    ball_indptr, ball_indices = dist_index.balls(d)
+    balls = csr_matrix((np.ones(len(ball_indices), dtype=np.int32), ball_indices, ball_indptr), shape=(n, n))
+    coverage = (membership @ balls).tocsr()
+    coverage.data[:] = 1
+    coverage.sort_indices()
+    return coverage
+
+
+# Stream the maximal cliques of G and keep them as candidates for phase I only if their closed
+# neighborhood NH[Q] in H = G^d is new and not contained in the closed neighborhood of a kept candidate.
+# A final pass, from the largest to the smallest neighborhood, drops the candidates dominated by one found
+# later. If cap is given, at most cap candidates are kept, chosen by the sampling policy:
+#   "first"   - the first cap candidates (the enumeration stops there)
+#   "largest" - the cap candidates with the largest closed neighborhoods
+#   "random"  - a uniform sample of cap candidates (reservoir sampling)
+# Vertices left uncovered by a capped sample get a maximal clique containing them.
+# The candidates are returned in the order nx.find_cliques produced them
+def candidate_cliques(G, dist_index, d, cap=None, sampling="first", seed=0):
+    if sampling not in CLIQUE_SAMPLING:
+        print("Invalid clique sampling policy")
+        sys.exit()
+    ball_indptr, ball_indices = dist_index.balls(d)
+    n = dist_index.n
+
+    # The closed neighborhoods of the kept candidates are sorted vertex arrays, and covering[v] lists the kept
+    # candidates whose closed neighborhood holds v (an inverted index). A dropped candidate stays in these lists
+    # until they are compacted, so the lists are checked against kept
+    kept = {}
+    covering = [[] for _ in range(n)]
+    covering_count = np.zeros(n, dtype=np.int64)
+    listed = np.zeros(n, dtype=np.int64)
+    signatures = set()
+    smallest = []
+    rng = random.Random(seed)
+    streamed = 0
+
+    def closed_neighborhood(clique):
+        return np.unique(gather_rows(ball_indptr, ball_indices, np.array(clique, dtype=np.int64))).astype(np.int32)
+
+    # Is NH[Q] contained in the closed neighborhood of a kept candidate? Only the candidates covering all the
+    # (up to three) vertices of NH[Q] covered least often need to be checked
+    def is_dominated(cover):
+        counts = covering_count[cover]
+        if counts.min() == 0:
+            return False
+        rarest = cover[np.argpartition(counts, 2)[:3]] if len(cover) > 3 else cover
+        lists = sorted((covering[vertex] for vertex in rarest.tolist()), key=len)
+        for index in set(lists[0]).intersection(*lists[1:]):
+            if index not in kept:
+                continue
+            other = kept[index][1]
+            if len(other) < len(cover):
+                continue
+            positions = np.searchsorted(other, cover)
+            if positions[-1] < len(other) and np.array_equal(other[positions], cover):
+                return True
+        return False
+
+    def keep(index, clique, cover):
+        for vertex in cover.tolist():
+            covering[vertex].append(index)
+        covering_count[cover] += 1
+        listed[cover] += 1
+        kept[index] = (clique, cover)
+
+    def drop(index):
+        _, cover = kept.pop(index)
+        covering_count[cover] -= 1
+        for vertex in cover[listed[cover] > 2 * covering_count[cover] + 8].tolist():
+            covering[vertex] = [other for other in dict.fromkeys(covering[vertex]) if other in kept]
+            listed[vertex] = len(covering[vertex])
+
+    for index, clique in enumerate(nx.find_cliques(G)):
+        cover = closed_neighborhood(clique)
+        signature = hashlib.blake2b(cover.tobytes(), digest_size=16).digest()
+        if signature in signatures:
+            continue
+        signatures.add(signature)
+        if is_dominated(cover):
+            continue
+
+        if cap is None or len(kept) < cap:
+            keep(index, clique, cover)
+            heapq.heappush(smallest, (len(cover), index))
+        elif sampling == "first":
+            break
+        elif sampling == "largest":
+            # Replace the kept candidate with the smallest closed neighborhood
+            while smallest[0][1] not in kept:
+                heapq.heappop(smallest)
+            if smallest[0][0] < len(cover):
+                drop(heapq.heappop(smallest)[1])
+                keep(index, clique, cover)
+                heapq.heappush(smallest, (len(cover), index))
+        else:
+            # Reservoir sampling over the non-dominated candidates
+            slot = rng.randrange(streamed + 1)
+            if slot < cap:
+                drop(rng.choice(list(kept)))
+                keep(index, clique, cover)
+        streamed += 1
+
+    # Drop the candidates dominated by a candidate found after them (the inverted index is left as it is, since
+    # it is checked against kept)
+    for index in sorted(kept, key=lambda index: -len(kept[index][1])):
+        clique, cover = kept.pop(index)
+        covering_count[cover] -= 1
+        if not is_dominated(cover):
+            kept[index] = (clique, cover)
+            covering_count[cover] += 1
+
+    # Make sure that every vertex is covered
+    for vertex in np.flatnonzero(covering_count == 0).tolist():
+        if covering_count[vertex] == 0:
+            clique = next(nx.find_cliques(G, nodes=[vertex]))
+            keep(-1 - vertex, clique, closed_neighborhood(clique))
+
+    return [kept[index][0] for index in sorted(kept, key=lambda index: (index < 0, abs(index)))]
+
+
+# When s is odd (section 3.5). Returns the partitions together with the status of the phase I model
+# (None unless UB_mode is IP), which uses threads Gurobi threads
+def calculate_UB_odd(G, s, UB_mode, problem, dist_index=None, clique_cap=None, clique_sampling="first",
+                     time_limit=TIME_LIMIT, threads=None):
+    # Distances up to (s-1)/2 define the power graph H
     d = (s - 1) // 2
-    H = nx.power(G, d)
+    if dist_index is None:
+        dist_index = DistanceIndex.from_graph(G, d)
+    status = None
 
-    # Create a list of the set of maximal cliques in H
-    cliques = list(nx.find_cliques(G))
+    # Create a list of the non-dominated maximal cliques in G (the candidates of phase I)
+    cliques = candidate_cliques(G, dist_index, d, clique_cap, clique_sampling)
     selected_clique_list = []
 
     if UB_mode == "IP":
         # Solves the IP in Phase I
         # Initialize the model
-        m = gp.Model()
-
-        # Add the variables
-        z = m.addVars(range(len(cliques)), vtype=GRB.BINARY)
-
-        # Set the objective function
-        m.setObjective(gp.quicksum(z[index] for index in range(len(cliques))), GRB.MINIMIZE)
+        m = session.model("clique cover", time_limit, threads)
 
-        # Create a linear expression for every node that corresponds to the LHS of (9b)
-        expr = [LinExpr() for _ in G.nodes]
-        for index in range(len(cliques)):
-            # If the vertex belongs to the clique, add the z variable corresponding to the clique to the vertex's LinExpr
-            for vertex in cliques[index]:
-                expr[vertex] += z[index]
-            # If the vertex is connected to the clique in H, add the z variable corresponding to the clique to vertex's
-            # LinExpr
-            for vertex in nx.node_boundary(H, cliques[index], None):
-                expr[vertex] += z[index]
+        # Add the variables, with the objective function
+        z = m.addMVar(len(cliques), vtype=GRB.BINARY, obj=1)
+        m.ModelSense = GRB.MINIMIZE
 
-        # Add constraint (9b)
-        m.addConstrs(expr[i] >= 1 for i in G.nodes)
-
-        # Set the parameters
-        m.Params.timeLimit = 60  # 60-second time limit
-        m.Params.method = 3  # Concurrent method
-        m.Params.Presolve = 1
+        # Add constraint (9b): every vertex belongs to, or is connected in H to, a selected clique. The rows of
+        # the matrix are the vertices and its columns the cliques covering them
+        covering_cliques = clique_coverage(cliques, dist_index, d).T.tocsr()
+        A = csr_matrix((np.ones(covering_cliques.nnz), covering_cliques.indices, covering_cliques.indptr),
+                       shape=covering_cliques.shape)
+        m.addMConstr(A, z, GRB.GREATER_EQUAL, np.ones(A.shape[0]))
 
         # Optimize the model
         m.optimize()
+        status = m.Status
 
         # Retrieve the solution
-        if m.status == GRB.OPTIMAL or m.status == GRB.TIME_LIMIT:
+        if m.SolCount > 0 and status in [GRB.OPTIMAL, GRB.TIME_LIMIT]:
+            selected = z.X > 0.5
+            m.dispose()
+
             # Add the attribute "assigned" to the vertices in G
             nx.set_node_attributes(G, False, "assigned")
 
             # Create the cliques from the solution
             for index in range(len(cliques)):
-                if z[index].x > 0.5:
+                if selected[index]:
                     clique = []
                     for vertex in cliques[index]:
                         if not G.nodes[vertex]["assigned"]:
                             clique.append(vertex)
                             G.nodes[vertex]["assigned"] = True
                     selected_clique_list.append(clique)
+        elif status == GRB.TIME_LIMIT:
+            # No solution within a short time limit: the greedy algorithm below selects the cliques
+            m.dispose()
+            UB_mode = "GRE"
         else:
             print("Unexpected model status from calculate_UB_odd")
             sys.exit()
-    elif UB_mode == "GRE":
-        U = set(G.nodes())
-        seen_vertices = set()
-        remaining_clique_list = copy.deepcopy(cliques)
-        while U:
+    if UB_mode == "GRE":
+        # Lazy greedy over the cliques: gain[Q] = |NH[Q] ∩ U| is kept up to date through the inverted
+        # index vertex -> cliques covering it, and the heap holds one possibly stale entry (-gain, Q)
+        # per remaining clique. Ties go to the clique found first by nx.find_cliques
+        coverage = clique_coverage(cliques, dist_index, d)
+        covering_cliques = coverage.T.tocsr()
+        gain = np.diff(coverage.indptr)
+        uncovered = np.ones(len(G), dtype=bool)
+        remaining = len(G)
+        heap = [(-int(gain[index]), index) for index in range(len(cliques))]
+        heapq.heapify(heap)
+        while remaining:
             # Pick a maximal clique Q that maximizes |NH[Q] ∩ U|
-            best_clique = None
-            max_intersection_size = -1
-            # Find all maximal cliques in the graph
-            for clique in remaining_clique_list:
-                # Convert the clique to a set for easier operations
-                clique_set = set(clique)
-                # Find NH[Q] (the closed neighborhood of Q)
-                closed_neighborhood = set(clique_set).union(nx.node_boundary(H, clique_set))
-                # Compute the intersection with U
-                intersection_size = len(closed_neighborhood.intersection(U))
-                # Keep track of the clique with the maximum intersection
-                if intersection_size > max_intersection_size:
-                    best_clique_list = clique
-                    best_clique = clique_set
-                    best_clique_filtered = clique_set - seen_vertices
-                    max_intersection_size = intersection_size
+            negative_gain, best_clique = heapq.heappop(heap)
+            if -negative_gain != gain[best_clique]:
+                heapq.heappush(heap, (-int(gain[best_clique]), best_clique))
+                continue
             # Add the selected maximal clique to cliques_list
-            if best_clique is not None:
-                selected_clique_list.append(best_clique_filtered)
-            remaining_clique_list.remove(best_clique_list)
-            # Update U by removing all vertices in NH[Q] from U
-            closed_neighborhood_best_clique = set(best_clique).union(nx.node_boundary(H, best_clique))
-            U.difference_update(closed_neighborhood_best_clique)
-    else:
+            selected_clique_list.append(set(cliques[best_clique]))
+            # Update U by removing all vertices in NH[Q] from U, and the gains of the cliques covering them
+            closed_neighborhood = coverage.indices[coverage.indptr[best_clique]:coverage.indptr[best_clique + 1]]
+            newly_covered = closed_neighborhood[uncovered[closed_neighborhood]]
+            uncovered[newly_covered] = False
+            remaining -= len(newly_covered)
+            np.subtract.at(gain, gather_rows(covering_cliques.indptr, covering_cliques.indices, newly_covered), 1)
+    elif UB_mode != "IP":
         print("Invalid UB_mode")
         sys.exit()
 
-    # Starts the phase II BFS-like assignment procedure which converts clusters into valid partitions
-    # Copy the graph and perform the BFS on the new copied graph
-    G_new = copy.deepcopy(G)
-    G_new.add_node('r')
-    V_Q = []
-    for idx, clique in enumerate(selected_clique_list):
-        # Create a new vertex v_Q for each clique
-        v_Q = f'v_{idx}'
-        V_Q.append(v_Q)
-        G_new.add_node(v_Q)
-        G_new.add_edge(v_Q, 'r')
-        # Connect v_{Q} to all vertices in its corresponding clique
-        for vertex in clique:
-            G_new.add_edge(v_Q, vertex)
-    bfs_tree = nx.bfs_tree(G_new, source='r')
-    # Create the partitions from the BFS tree
-    T_minus_r = bfs_tree.copy()
-    T_minus_r.remove_node('r')
-    T_minus_r_undirected = T_minus_r.to_undirected()
-    partitions = list(nx.connected_components(T_minus_r_undirected))
-    partitions = [list(partition) for partition in partitions]
-    partitions =[[v for v in partition if v not in V_Q] for partition in partitions]
+    # Starts the phase II BFS-like assignment procedure which converts clusters into valid partitions:
+    # a multi-source BFS where the vertices of every selected clique seed its cluster
+    cluster_id = assign_clusters(dist_index.indptr, dist_index.indices, selected_clique_list)
+    partitions = clusters_from_labels(cluster_id, len(selected_clique_list))
 
     # Check the solution
     valid_solution = check_solution(G, s, partitions, problem)
     if valid_solution:
-        return partitions
+        return partitions, status
     else:
         print("The obtained solution from calculate_UB_odd is not feasible")
         sys.exit()
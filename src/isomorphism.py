@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import networkx as nx
+import numpy as np
+import cache
+
+# Only components with at most this many vertices are looked up (and stored) by isomorphism class
+ISOMORPHISM_LIMIT = 100
+
+# Number of (hash, s) entries kept in memory, least recently used first out
+MAX_ENTRIES = 4096
+
+# Iterations of the Weisfeiler-Lehman hash
+WL_ITERATIONS = 3
+
+# Modes of the isomorphism cache: in memory only, also on disk (see cache.py), or turned off
+ISOMORPHISM_CACHE = ["memory", "disk", "off"]
+
+PROBLEMS = ["Covering", "Partitioning"]
+
+
+# Optimal covering and partitioning values of components, keyed by their isomorphism class and s. The
+# components are bucketed by their Weisfeiler-Lehman hash, and a component matches an entry of its bucket
+# only if it is isomorphic to the stored graph (the hash may collide). Every entry holds the optimal values
+# known so far, as a dict problem -> value
+class IsomorphismCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+
+    # Bucket (list of [graph, values]) of the hash h and s, from memory or, if on_disk, from the disk cache
+    def bucket(self, h, s, on_disk):
+        key = (h, s)
+        if key in self.buckets:
+            self.buckets.move_to_end(key)
+            return self.buckets[key]
+        bucket = []
+        fields = ("sizes", "edge_counts", "u", "v") + tuple(PROBLEMS)
+        arrays = cache.load_arrays(h, "iso_s" + str(s), fields) if on_disk else None
+        if arrays is not None:
+            edge_ends = np.cumsum(arrays["edge_counts"])
+            for i, n in enumerate(arrays["sizes"].tolist()):
+                G = nx.empty_graph(n)
+                start = edge_ends[i] - arrays["edge_counts"][i]
+                G.add_edges_from(zip(arrays["u"][start:edge_ends[i]].tolist(),
+                                     arrays["v"][start:edge_ends[i]].tolist()))
+                values = {problem: int(arrays[problem][i]) for problem in PROBLEMS if arrays[problem][i] >= 0}
+                bucket.append([G, values])
+        self.buckets[key] = bucket
+        if len(self.buckets) > self.max_entries:
+            self.buckets.popitem(last=False)
+        return bucket
+
+    # Entry [graph, values] of the component G in the bucket, or None
+    @staticmethod
+    def match(bucket, G):
+        for entry in bucket:
+            if entry[0].number_of_edges() == G.number_of_edges() and nx.is_isomorphic(entry[0], G):
+                return entry
+        return None
+
+    # Optimal values known for the component G (a networkx graph) and s, as a dict problem -> value
+    def lookup(self, G, s, on_disk=False):
+        h = nx.weisfeiler_lehman_graph_hash(G, iterations=WL_ITERATIONS)
+        entry = self.match(self.bucket(h, s, on_disk), G)
+        return {} if entry is None else dict(entry[1])
+
+    # Record optimal values (a dict problem -> value) of the component G and s
+    def store(self, G, s, values, on_disk=False):
+        h = nx.weisfeiler_lehman_graph_hash(G, iterations=WL_ITERATIONS)
+        bucket = self.bucket(h, s, on_disk)
+        entry = self.match(bucket, G)
+        if entry is None:
+            bucket.append([G, dict(values)])
+        elif all(entry[1].get(problem) == value for problem, value in values.items()):
+            return
+        else:
+            entry[1].update(values)
+        if on_disk:
+            edges = [np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2) for graph, _ in bucket]
+            cache.save_arrays(h, "iso_s" + str(s),
+                              sizes=np.array([graph.number_of_nodes() for graph, _ in bucket], dtype=np.int64),
+                              edge_counts=np.array([len(e) for e in edges], dtype=np.int64),
+                              u=np.concatenate([e[:, 0] for e in edges]), v=np.concatenate([e[:, 1] for e in edges]),
+                              **{problem: np.array([known.get(problem, -1) for _, known in bucket], dtype=np.int64)
+                                 for problem in PROBLEMS})
+
+
+# Classes of isomorphic graphs among graphs (a dict index -> networkx graph with vertices 0, ..., n-1), bucketed
+# by their Weisfeiler-Lehman hash and confirmed by an isomorphism. Returns a list of (representative,
+# members), where members lists (index, mapping) for the other graphs of the class, and mapping[v] is the
+# vertex of the member matched to the vertex v of the representative
+def isomorphism_classes(graphs):
+    buckets = {}
+    for index, G in graphs.items():
+        key = (nx.weisfeiler_lehman_graph_hash(G, iterations=WL_ITERATIONS), G.number_of_edges())
+        bucket = buckets.setdefault(key, [])
+        for representative, members in bucket:
+            matcher = nx.isomorphism.GraphMatcher(graphs[representative], G)
+            if matcher.is_isomorphic():
+                mapping = np.empty(G.number_of_nodes(), dtype=np.int64)
+                for u, v in matcher.mapping.items():
+                    mapping[u] = v
+                members.append((index, mapping))
+                break
+        else:
+            bucket.append((index, []))
+    return [entry for bucket in buckets.values() for entry in bucket]
+
+
+# The cache of this process
+RESULTS = IsomorphismCache()
@@ -1,30 +1,236 @@
-import gurobipy as gp
+import time
+import heapq
+import random
+import numpy as np
+from scipy.sparse import csr_matrix
 from gurobipy import GRB
+from power import gather_rows
+import session
 
+# Time limit (in seconds) of the maximum independent set IP
+TIME_LIMIT = 60
 
-# Solve the maximum independent set problem
-def find_max_indep_set(H):
-    # Initialize the model
-    m = gp.Model()
+# Modes of find_max_indep_set: the IP, the combinatorial local search, or the IP warm started by the local search
+LB_MODES = ["IP", "ILS", "IP+ILS"]
+
+# Share of the time limit given to the local search in IP+ILS mode
+ILS_SHARE = 0.25
+
+# The local search stops after this many perturbations in a row without improving the best set, or after
+# ILS_STALL_PER_VERTEX perturbations per vertex for small graphs
+ILS_STALL_ITERATIONS = 2000
+ILS_STALL_PER_VERTEX = 10
+
+
+# Greedy independent set of the graph with CSR adjacency (indptr, indices): repeatedly take a vertex of
+# minimum degree in the remaining graph and delete it together with its neighbors. Ties go to the smallest vertex
+def greedy_indep_set(indptr, indices):
+    n = len(indptr) - 1
+    degree = np.diff(indptr).astype(np.int64)
+    alive = np.ones(n, dtype=bool)
+    heap = [(int(degree[v]), v) for v in range(n)]
+    heapq.heapify(heap)
+    independent_set = []
+    while heap:
+        d, v = heapq.heappop(heap)
+        # Skip deleted vertices and entries whose degree is stale
+        if not alive[v] or d != degree[v]: continue
+        independent_set.append(v)
+        deleted = indices[indptr[v]:indptr[v + 1]]
+        deleted = np.append(deleted[alive[deleted]], v)
+        alive[deleted] = False
+        # The remaining neighbors of the deleted vertices lose one degree per deleted neighbor
+        neighbors = gather_rows(indptr, indices, deleted)
+        neighbors = neighbors[alive[neighbors]]
+        np.subtract.at(degree, neighbors, 1)
+        for w in np.unique(neighbors).tolist():
+            heapq.heappush(heap, (int(degree[w]), w))
+    return independent_set
+
+
+# Iterated local search for the maximum independent set problem in the style of Andrade, Resende and
+# Werneck ("Fast local search for the maximum independent set problem"). The solution is kept as a mask
+# together with the tightness of every vertex, i.e., its number of neighbors in the solution
+class IndepSetSearch:
+    def __init__(self, indptr, indices, independent_set, seed=0):
+        self.indptr = indptr
+        self.indices = indices
+        n = len(indptr) - 1
+        self.in_set = np.zeros(n, dtype=bool)
+        self.tight = np.zeros(n, dtype=np.int64)
+        self.size = 0
+        self.random = random.Random(seed)
+        for v in independent_set:
+            self.insert(v)
+
+    def neighbors(self, v):
+        return self.indices[self.indptr[v]:self.indptr[v + 1]]
+
+    def insert(self, v):
+        self.in_set[v] = True
+        self.tight[self.neighbors(v)] += 1
+        self.size += 1
+
+    def remove(self, v):
+        self.in_set[v] = False
+        self.tight[self.neighbors(v)] -= 1
+        self.size -= 1
+
+    # Insert the free vertices (outside the solution, without neighbors in it) among candidates
+    def insert_free(self, candidates):
+        inserted = []
+        for w in candidates[self.tight[candidates] == 0].tolist():
+            if self.tight[w] == 0 and not self.in_set[w]:
+                self.insert(w)
+                inserted.append(w)
+        return inserted
 
-    # Add variables
-    y = m.addVars(H.nodes, vtype=GRB.BINARY)
+    # (1,2)-swap: replace the solution vertex x by two non-adjacent neighbors whose only solution neighbor is x.
+    # Returns the inserted vertices (empty if there is no such pair)
+    def two_improvement(self, x):
+        neighbors = self.neighbors(x)
+        one_tight = neighbors[self.tight[neighbors] == 1]
+        for position, u in enumerate(one_tight.tolist()):
+            # one_tight and the rows of the adjacency are sorted, so v > u is enough
+            candidates = one_tight[position + 1:]
+            candidates = candidates[~np.isin(candidates, self.neighbors(u), assume_unique=True)]
+            if len(candidates):
+                v = int(candidates[0])
+                self.remove(x)
+                self.insert(u)
+                self.insert(v)
+                return [u, v] + self.insert_free(neighbors)
+        return []
+
+    # Apply (1,2)-swaps until none is left, starting from the solution vertices in stack
+    def local_search(self, stack):
+        while stack:
+            x = stack.pop()
+            if self.in_set[x]:
+                stack.extend(self.two_improvement(x))
+
+    # Force a random vertex outside the solution into it, removing its solution neighbors, and repair the
+    # solution around the removed vertices by local search
+    def perturb(self):
+        outside = np.flatnonzero(~self.in_set)
+        v = int(outside[self.random.randrange(len(outside))])
+        neighbors = self.neighbors(v)
+        removed = neighbors[self.in_set[neighbors]]
+        for u in removed.tolist():
+            self.remove(u)
+        self.insert(v)
+        around = gather_rows(self.indptr, self.indices, removed)
+        inserted = self.insert_free(np.unique(around))
+        self.local_search([v] + inserted + np.unique(around[self.in_set[around]]).tolist())
+
+    # Run the local search from the current solution, then perturb it as long as the budget allows. A perturbed
+    # solution is kept if it is at least as large as the current one. Returns the best independent set found
+    def run(self, time_limit, stall_iterations=ILS_STALL_ITERATIONS):
+        start = time.time()
+        stall_iterations = min(stall_iterations, ILS_STALL_PER_VERTEX * len(self.in_set))
+        self.local_search(np.flatnonzero(self.in_set).tolist())
+        best = self.in_set.copy()
+        best_size = self.size
+        stall = 0
+        while stall < stall_iterations and self.size < len(self.in_set) and time.time() - start < time_limit:
+            in_set, tight, size = self.in_set.copy(), self.tight.copy(), self.size
+            self.perturb()
+            if self.size > best_size:
+                best = self.in_set.copy()
+                best_size = self.size
+                stall = 0
+            else:
+                stall += 1
+            if self.size < size:
+                # Revert the perturbation
+                self.in_set, self.tight, self.size = in_set, tight, size
+        return np.flatnonzero(best).tolist()
+
+
+# Cliques of the graph with CSR adjacency (indptr, indices) covering all its edges. Every clique starts with
+# an uncovered edge uw and is extended greedily by the vertices w' adjacent to all of its vertices with uw'
+# uncovered, so that the cliques stay small and every one of them covers new edges
+def clique_edge_cover(indptr, indices):
+    n = len(indptr) - 1
+    # Entry (a, b) of the adjacency has key a * n + b; the keys are sorted since the rows are
+    keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr)) * n + indices
+    covered = np.zeros(len(indices), dtype=bool)
+    adjacent = np.zeros(n, dtype=bool)
+    cliques = []
+    for u in range(n):
+        row = indices[indptr[u]:indptr[u + 1]]
+        while True:
+            uncovered = row[~covered[indptr[u]:indptr[u + 1]]]
+            if not len(uncovered): break
+            clique = [u]
+            candidates = uncovered
+            while len(candidates):
+                w = int(candidates[0])
+                clique.append(w)
+                # Keep the candidates adjacent to w
+                neighbors = indices[indptr[w]:indptr[w + 1]]
+                adjacent[neighbors] = True
+                candidates = candidates[adjacent[candidates]]
+                adjacent[neighbors] = False
+            # Mark the edges inside the clique as covered
+            members = np.array(clique, dtype=np.int64)
+            pairs = (members[:, None] * n + members[None, :])[~np.eye(len(members), dtype=bool)]
+            covered[np.searchsorted(keys, pairs)] = True
+            cliques.append(clique)
+    return cliques
+
+
+# Find a large independent set of the graph H given by its (symmetric) CSR adjacency matrix with sorted indices.
+# In IP mode, it solves the maximum independent set problem with clique inequalities; in ILS mode, it runs
+# the greedy algorithm followed by the iterated local search; in IP+ILS mode, the set found by the local search
+# (within a share ILS_SHARE of the time limit) is the MIP start of the IP, which uses threads Gurobi threads.
+# Returns the independent set together with the status of the model (None in ILS mode)
+def find_max_indep_set(H, time_limit=TIME_LIMIT, mode="IP", threads=None):
+    start = time.time()
+    n = H.shape[0]
+    if not H.has_sorted_indices:
+        H = H.sorted_indices()
+    indptr, indices = H.indptr.astype(np.int64), H.indices.astype(np.int64)
+
+    if mode != "IP":
+        search = IndepSetSearch(indptr, indices, greedy_indep_set(indptr, indices))
+        warm_start = search.run(time_limit if mode == "ILS" else ILS_SHARE * time_limit)
+        if mode == "ILS":
+            return warm_start, None
+
+    # Initialize the model
+    m = session.model("MIS", max(0, time_limit - (time.time() - start)), threads)
 
-    # Set objective function
-    m.setObjective(gp.quicksum(y), GRB.MAXIMIZE)
+    # Add variables, with the objective function
+    y = m.addMVar(n, vtype=GRB.BINARY, obj=1)
+    m.ModelSense = GRB.MAXIMIZE
 
-    # Add constraints
-    m.addConstrs(y[i] + y[j] <= 1 for (i, j) in H.edges)
+    # Add constraints: at most one vertex of every clique of an edge cover of H, as the rows of a
+    # clique-vertex incidence matrix
+    cliques = clique_edge_cover(indptr, indices)
+    sizes = np.array([len(clique) for clique in cliques], dtype=np.int64)
+    members = np.array([i for clique in cliques for i in clique], dtype=np.int64)
+    A = csr_matrix((np.ones(len(members)), members, np.concatenate([[0], np.cumsum(sizes)])),
+                   shape=(len(cliques), n))
+    m.addMConstr(A, y, GRB.LESS_EQUAL, np.ones(len(cliques)))
 
-    # Set parameters
-    m.Params.timeLimit = 60
-    m.Params.Presolve = 1
+    # Start from the set found by the local search
+    if mode == "IP+ILS":
+        start_values = np.zeros(n)
+        start_values[warm_start] = 1
+        y.Start = start_values
 
     # Optimize model
     m.optimize()
+    status = m.Status
 
-    if m.status == GRB.OPTIMAL or m.status == GRB.TIME_LIMIT:
+    if m.SolCount > 0 and status in [GRB.OPTIMAL, GRB.TIME_LIMIT]:
         # Get the solution
-        return [i for i in H.nodes if y[i].x > 0.5]
+        independent_set = np.flatnonzero(y.X > 0.5).tolist()
+    elif status == GRB.TIME_LIMIT:
+        # No solution within a short time limit: the set of the local search, or the greedy one
+        independent_set = warm_start if mode == "IP+ILS" else greedy_indep_set(indptr, indices)
     else:
-        return "Model status != optimal"
+        independent_set = "Model status != optimal"
+    m.dispose()
+    return independent_set, status
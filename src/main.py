@@ -1,16 +1,14 @@
 ###########################
 # Imports
 ###########################
-import networkx as nx
 import sys
-import time
-import heuristic
 import json
 import os
-import read
+import batch
 import lb
-import s_club_ext_label
-import sasha
+import isomorphism
+import cutpool
+import search
 from datetime import date
 import csv
 from csv import DictWriter
@@ -36,6 +34,10 @@ if len(sys.argv) > 1:
 else:
     config_filename = 'config.json'  # default
 
+# The configs run concurrently on at most this many cores, given as a second argument (default: all of them)
+#       python main.py usethisconfig.json 8
+max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
 print("Reading config from ", config_filename)
 
 config_filename_wo_extension = config_filename.rsplit('.', 1)[0]
@@ -53,8 +55,8 @@ today_string = today.strftime("%Y_%b_%d")  # Year_Month_Day, like 2019_Sept_16
 results_filename = "../results_for_" + config_filename_wo_extension + "/results_" + config_filename_wo_extension +\
                    "_" + today_string + ".csv"
 # Delete the last field
-fields = ["Instance", "Problem", "s", "Model", "|V|", "|E|", "LB", "LB Time (seconds)",
-          "UB", "UB Time (seconds)", "Total Time (seconds)", "Objective Value", "Objective Bound"]
+fields = ["Instance", "Problem", "s", "Model", "Search", "|V|", "|E|", "LB", "LB Time (seconds)",
+          "UB", "UB Time (seconds)", "Total Time (seconds)", "Objective Value", "Objective Bound", "Status"]
 
 
 ################################################
@@ -77,120 +79,40 @@ with open(results_filename, 'w', newline='') as csvfile:
 ############################################################
 # Run experiments for each config in batch_config file
 ############################################################
-# Read through the config files to run all instances
+# Check all the configs before running any of them
 for key in batch_configs.keys():
-    # Read in the instance configuration
     config = batch_configs[key]
     problem = config['Problem']
-    s = config['s']
-    base = config['Model']
-    instance = config['Instance']
     if problem not in ["Partitioning", "Covering", "LB+UB"]:
         print("Invalid problem.")
         sys.exit()
-    if problem == "LB+UB":
-        models = False
-        UB_mode = base
-    else:
-        models = True
-        # The default UB_mode is IP unless specified otherwise
-        UB_mode = "IP"
-    if s < 2:
+    if config['s'] < 2:
         print("Invalid s.")
         sys.exit()
-    print("Solving " + instance + " under " + base + " model:")
-
-    # Start the time counter
-    total_start = time.time()
-
-    # Read file
-    G_original = read.read_files("../data/", instance)
-    print("# of nodes of G: ", len(G_original.nodes))
-    print("# of edges of G: ", len(G_original.edges))
-
-    # Find connected components of G
-    G_induced_subgraphs = [G_original.subgraph(component) for component in nx.connected_components(G_original)]
-
-    # Initialize final variables
-    if problem == "LB+UB":
-        obj_Value = "N/A"
-        obj_Bound = "N/A"
-    else:
-        obj_Value = 0
-        obj_Bound = 0
-    LB = 0
-    LB_Time = 0
-    UB = 0
-    UB_Time = 0
-
-    for iteration in range(len(G_induced_subgraphs)):
-        # Display the information of G
-        G = nx.convert_node_labels_to_integers(G_induced_subgraphs[iteration])
-
-        # Lower bound
-        print("Starting the lower bound calculation")
-        H = nx.power(G, s)
-        start_indep_set = time.time()
-        potential_roots = lb.find_max_indep_set(H)
-        stop_indep_set = time.time()
-        LB_Time += round(stop_indep_set - start_indep_set, 2)
-        LB_iteration = len(potential_roots)
-        LB += LB_iteration
-
-        # Upper bound
-        print("Starting the upper bound calculation through heuristic")
-        start_heur = time.time()
-        if s % 2 == 0:
-            feasible_partitions = heuristic.calculate_UB_even(G, s, UB_mode, problem)
-        else:
-            feasible_partitions = heuristic.calculate_UB_odd(G, s, UB_mode, problem)
-        finish_heur = time.time()
-        UB_iteration = len(feasible_partitions)
-        UB_Time += finish_heur - start_heur
-        UB += UB_iteration
-
-        # Solve to optimality if the base is not LB+UB
-        if problem != "LB+UB":
-            if LB_iteration == UB_iteration:
-                print("LB = UB in this iteration, and the optimal is found")
-                # Add iteration variables to final variables
-                obj_Value += LB_iteration
-                obj_Bound += LB_iteration
-            else:
-                # Solve the s-club problem with the selected model
-                if base == "ext_label":
-                    opt_obj, obj_bound, status = s_club_ext_label.solve_s_club_ext_label(
-                        G, s, potential_roots, feasible_partitions, UB_iteration, problem)
-                elif base == "Sasha":
-                    opt_obj, obj_bound, status = sasha.solve_s_club_with_sasha(G, s, potential_roots,
-                                                                               feasible_partitions, UB_iteration, problem)
-                else:
-                    print("Please enter a correct base model")
-                    sys.exit()
-
-                # Add iteration variables to final variables
-                obj_Value += opt_obj
-                obj_Bound += max(obj_bound, LB_iteration)
-
-
-
-    # Finish time counter
-    finish_time = time.time()
-    total_time = finish_time - total_start
+    if problem != "LB+UB" and config['Model'] not in ["ext_label", "Sasha", "centering", "Benders"]:
+        print("Please enter a correct base model")
+        sys.exit()
+    if config.get('LB Mode', "IP") not in lb.LB_MODES:
+        print("Invalid LB Mode.")
+        sys.exit()
+    if config.get('Isomorphism Cache', "memory") not in isomorphism.ISOMORPHISM_CACHE:
+        print("Invalid Isomorphism Cache.")
+        sys.exit()
+    if config.get('Search', "off") not in search.SEARCH_MODES or config.get('Probe Time Limit', 1) <= 0:
+        print("Invalid Search.")
+        sys.exit()
+    if config.get('Cut Pool', "disk") not in cutpool.CUT_POOL:
+        print("Invalid Cut Pool.")
+        sys.exit()
+    if config.get('Cut Nodes', 0) < 0 or config.get('Cut Rounds', 0) < 0 or config.get('Cut Violation', 1) <= 0:
+        print("Invalid user cut limits.")
+        sys.exit()
+    if config.get('Gurobi Output', 1) not in [0, 1]:
+        print("Invalid Gurobi Output.")
+        sys.exit()
+    if config.get('Time Limit', 1) <= 0 or config.get('Instance Gap', 0) < 0:
+        print("Invalid Time Limit or Instance Gap.")
+        sys.exit()
 
-    # Put final results at .csv file
-    result = {}
-    result["Instance"] = instance
-    result["Problem"] = problem
-    result["Model"] = base
-    result["s"] = s
-    result["|V|"] = len(G_original.nodes)
-    result["|E|"] = len(G_original.edges)
-    result["LB"] = LB
-    result["LB Time (seconds)"] = '{0:.2f}'.format(LB_Time)
-    result["UB"] = UB
-    result["UB Time (seconds)"] = '{0:.2f}'.format(UB_Time)
-    result["Total Time (seconds)"] = '{0:.2f}'.format(total_time)
-    result["Objective Value"] = obj_Value
-    result["Objective Bound"] = obj_Bound
-    append_dict_as_row(results_filename, result, fields)
+# Run the configs concurrently, writing every row to the csv file as soon as its run finishes
+batch.run_batch(batch_configs, lambda result: append_dict_as_row(results_filename, result, fields), max_threads)
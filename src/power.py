@@ -0,0 +1,105 @@
+import numpy as np
+from scipy.sparse import csr_matrix, identity
+
+# Runs refuse to build distance balls (i.e., power graphs) estimated to take more memory than this
+MAX_POWER_BYTES = 8 * 1024 ** 3
+
+# Memory per stored (vertex, distance) pair: an int64 index and a uint8/uint16 distance
+BYTES_PER_ENTRY = 10
+
+# Number of sources sampled to estimate the size of the power graph
+ESTIMATE_SAMPLES = 32
+
+# The sparse products are carried out on blocks of rows holding about this many entries
+BLOCK_ENTRIES = 2 * 10 ** 7
+
+
+# Concatenation of the rows of a CSR structure (indptr, indices)
+def gather_rows(indptr, indices, rows):
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return indices[offsets]
+
+
+# Breadth-first search from source truncated at depth s. Returns the reached vertices (in BFS order)
+# together with their distance from the source
+def truncated_bfs(indptr, indices, source, s, visited):
+    reached = [np.array([source], dtype=np.int64)]
+    layers = [np.zeros(1, dtype=np.int64)]
+    visited[source] = True
+    frontier = reached[0]
+    for depth in range(1, s + 1):
+        # Gather the neighbors of the whole frontier at once
+        candidates = gather_rows(indptr, indices, frontier)
+        candidates = candidates[~visited[candidates]]
+        if len(candidates) == 0:
+            break
+        # Keep the first occurrence of every new vertex
+        _, first = np.unique(candidates, return_index=True)
+        frontier = candidates[np.sort(first)]
+        visited[frontier] = True
+        reached.append(frontier)
+        layers.append(np.full(len(frontier), depth, dtype=np.int64))
+    reached = np.concatenate(reached)
+    visited[reached] = False
+    return reached, np.concatenate(layers)
+
+
+# Estimate the number of pairs within distance r (including the pairs (v, v)) from truncated BFSs
+# run from a sample of the vertices
+def estimate_power_entries(indptr, indices, r, samples=ESTIMATE_SAMPLES, seed=0):
+    n = len(indptr) - 1
+    if n == 0:
+        return 0
+    visited = np.zeros(n, dtype=bool)
+    if n <= samples:
+        sources = range(n)
+    else:
+        sources = np.random.default_rng(seed).choice(n, samples, replace=False).tolist()
+    sizes = [len(truncated_bfs(indptr, indices, v, r, visited)[0]) for v in sources]
+    return int(np.mean(sizes) * n)
+
+
+# Estimated memory (in bytes) taken by the distance balls of radius r
+def estimate_power_bytes(indptr, indices, r):
+    return estimate_power_entries(indptr, indices, r) * BYTES_PER_ENTRY + 8 * len(indptr)
+
+
+# Distances up to r between all pairs of vertices, stored row by row as (ball_indptr, ball_indices,
+# ball_dist), where the row of v lists the vertices within distance r of v sorted by label.
+# Blocks of rows are expanded frontier by frontier with sparse products: the k-th frontier is the
+# boolean product of the previous frontier with the adjacency matrix A, minus the pairs already reached.
+# A block stops early once its frontier is empty (i.e., its balls are saturated)
+def bounded_distances(indptr, indices, r, dtype):
+    n = len(indptr) - 1
+    adjacency = csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(n, n))
+    average_ball = max(1, estimate_power_entries(indptr, indices, r) // max(n, 1))
+    block_rows = max(1, BLOCK_ENTRIES // average_ball)
+
+    ball_indptr = np.zeros(n + 1, dtype=np.int64)
+    blocks_indices = []
+    blocks_dist = []
+    for start in range(0, n, block_rows):
+        end = min(n, start + block_rows)
+        frontier = identity(n, dtype=np.int32, format="csr")[start:end]
+        reached = frontier.copy()
+        # Every reached pair at distance d is stored as r + 1 - d, which is never zero
+        closeness = frontier * (r + 1)
+        for k in range(1, r + 1):
+            frontier = frontier @ adjacency
+            frontier.data[:] = 1
+            frontier = frontier - frontier.multiply(reached)
+            frontier.eliminate_zeros()
+            if frontier.nnz == 0:
+                break
+            reached = reached + frontier
+            closeness = closeness + frontier * (r + 1 - k)
+        closeness = closeness.tocsr()
+        closeness.sort_indices()
+        ball_indptr[start + 1:end + 1] = ball_indptr[start] + closeness.indptr[1:]
+        blocks_indices.append(closeness.indices.astype(np.int64))
+        blocks_dist.append((r + 1 - closeness.data).astype(dtype))
+    if n == 0:
+        return ball_indptr, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=dtype)
+    return ball_indptr, np.concatenate(blocks_indices), np.concatenate(blocks_dist)
@@ -1,67 +1,188 @@
 import networkx as nx
+import numpy as np
 import os
+import re
+import sys
+from itertools import chain, islice
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse import csr_matrix
+
+# Supported file types, in the order they are looked up
+FILE_TYPES = [".graph", ".txt", ".gml"]
+
+
+# An undirected simple graph on the vertices 0, ..., n-1 stored as a CSR adjacency (indptr, indices).
+# The networkx view is only built when a caller asks for it
+class CSRGraph:
+    def __init__(self, n, indptr, indices):
+        self.n = n
+        self.indptr = indptr
+        self.indices = indices
+        self._graph = None
+        self._position = None
+
+    def number_of_nodes(self):
+        return self.n
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def neighbors(self, v):
+        return self.indices[self.indptr[v]:self.indptr[v + 1]]
+
+    # The graph as a scipy.sparse adjacency matrix
+    def to_scipy(self):
+        return csr_matrix((np.ones(len(self.indices), dtype=np.int8), self.indices, self.indptr),
+                          shape=(self.n, self.n))
+
+    # The graph as a networkx graph (built once and cached)
+    def to_networkx(self):
+        if self._graph is None:
+            G = nx.empty_graph(self.n)
+            rows = np.repeat(np.arange(self.n), np.diff(self.indptr))
+            upper = rows < self.indices
+            G.add_edges_from(zip(rows[upper].tolist(), self.indices[upper].tolist()))
+            self._graph = G
+        return self._graph
+
+    # Vertex sets of the connected components, ordered by their smallest vertex
+    def components(self):
+        count, labels = connected_components(self.to_scipy(), directed=False)
+        order = np.argsort(labels, kind="stable")
+        boundaries = np.cumsum(np.bincount(labels, minlength=count))[:-1]
+        return np.split(order, boundaries)
+
+    # Induced subgraph on the sorted vertex array nodes, relabeled to 0, ..., len(nodes)-1.
+    # nodes must be closed under adjacency (e.g., a connected component)
+    def subgraph(self, nodes):
+        if self._position is None:
+            self._position = np.zeros(self.n, dtype=np.int64)
+        self._position[nodes] = np.arange(len(nodes))
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        offsets = np.repeat(starts - indptr[:-1], counts) + np.arange(indptr[-1])
+        return CSRGraph(len(nodes), indptr, self._position[self.indices[offsets]])
+
+
+# Build the CSR adjacency of the simple undirected graph with edges (u[i], v[i]).
+# Self-loops and duplicate edges are dropped
+def edges_to_csr(n, u, v):
+    keep = u != v
+    low = np.minimum(u[keep], v[keep])
+    high = np.maximum(u[keep], v[keep])
+    keys = np.unique(low * n + high)
+    low, high = keys // n, keys % n
+    rows = np.concatenate([low, high])
+    cols = np.concatenate([high, low])
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return CSRGraph(n, indptr, cols[order])
+
 
 # Read files of type .graph
 def read_graph(fname):
     with open(fname, "r") as f:
 
-        # Take number of nodes
+        # Take number of nodes and the METIS format flags (vertex sizes, vertex weights, edge weights)
         line = f.readline().strip().split()
         n = int(line[0])
-        
-        # Create an empty graph
-        G = nx.empty_graph(n)
-        edges = []
-        vertex = 0
-        
-        # Iterate through each line
-        for _ in range(n):
-            line = f.readline().strip().split()
-            
-            # Populate the edge set
-            for neighbor in line:
-                if vertex < int(neighbor)-1 and (vertex, int(neighbor)-1) not in edges:
-                    edges.append((vertex, int(neighbor)-1))
-            vertex += 1
-        G.add_edges_from(edges)
-    
-    return G
+        fmt = line[2].zfill(3) if len(line) > 2 else "000"
+        skip = (fmt[0] == "1") + (int(line[3]) if len(line) > 3 else 1) * (fmt[1] == "1")
+        step = 2 if fmt[2] == "1" else 1
+
+        # Read the n adjacency lists in bulk, dropping vertex sizes/weights and edge weights
+        adjacency = [line.split()[skip::step] for line in islice(f, n)]
+
+    # Populate the edge set with the pairs (vertex, neighbor) where vertex < neighbor
+    counts = np.fromiter(map(len, adjacency), dtype=np.int64, count=len(adjacency))
+    rows = np.repeat(np.arange(len(adjacency), dtype=np.int64), counts)
+    cols = np.array(list(chain.from_iterable(adjacency)), dtype=np.int64) - 1
+    upper = rows < cols
+    return edges_to_csr(n, rows[upper], cols[upper])
+
 
 # Read files of type .txt
 def read_txt(fname):
     with open(fname, "r") as f:
         line = f.readline().strip().split()
         m = int(line[1])
-        
-        # Create an empty graph
-        G = nx.Graph()
-        edges = []
-        
-        # Iterate through each line
-        for _ in range(m):
-            line = f.readline().strip().split()
-            
-            # Populate the edge set
-            edges.append((int(line[0]), int(line[1])))
-        G.add_edges_from(edges)
-        G = nx.convert_node_labels_to_integers(G)
-    
-    return G
-
-# Select the correct function to read the file
+
+        # Read the m edges in bulk
+        edges = np.array([line.split()[:2] for line in islice(f, m)], dtype=np.int64).reshape(-1, 2)
+
+    # Label the vertices 0, 1, ... in order of first appearance
+    labels, first, inverse = np.unique(edges.ravel(), return_index=True, return_inverse=True)
+    rank = np.empty(len(labels), dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(labels))
+    endpoints = rank[inverse].reshape(-1, 2)
+    return edges_to_csr(len(labels), endpoints[:, 0], endpoints[:, 1])
+
+
+# Read files of type .gml. Vertices are labeled 0, 1, ... in the order of their ids in the file,
+# and edge directions and multiplicities are ignored
+def read_gml(fname):
+    with open(fname, "r") as f:
+        tokens = re.findall(r'"[^"]*"|\[|\]|[^\s\[\]]+', f.read())
+
+    ids = []
+    sources = []
+    targets = []
+    depth = 0
+    section = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "[":
+            depth += 1
+        elif token == "]":
+            depth -= 1
+            if depth == 1:
+                section = None
+        elif i + 1 < len(tokens) and tokens[i + 1] != "[":
+            # A key-value pair
+            if depth == 2 and section == "node" and token == "id":
+                ids.append(int(tokens[i + 1]))
+            elif depth == 2 and section == "edge" and token == "source":
+                sources.append(int(tokens[i + 1]))
+            elif depth == 2 and section == "edge" and token == "target":
+                targets.append(int(tokens[i + 1]))
+            i += 1
+        elif depth == 1:
+            # The key of a list, e.g., node [ ... ] or edge [ ... ]
+            section = token
+        i += 1
+
+    ids = np.array(ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    position = order[np.searchsorted(ids[order], np.array(sources, dtype=np.int64))]
+    other = order[np.searchsorted(ids[order], np.array(targets, dtype=np.int64))]
+    return edges_to_csr(len(ids), position, other)
+
+
+# Find the file of the selected instance
+def find_file(ext, instance):
+    for type in FILE_TYPES:
+        fname = os.path.join(ext, instance + type)
+        if os.path.isfile(fname):
+            return fname, type
+    print("Instance", instance, "not found in", ext)
+    sys.exit()
+
+
+# Read the selected instance as a CSRGraph
+def load_graph(ext, instance):
+    fname, type = find_file(ext, instance)
+    if type == ".graph":
+        return read_graph(fname)
+    elif type == ".txt":
+        return read_txt(fname)
+    else:
+        return read_gml(fname)
+
+
+# Read the selected instance as a networkx graph
 def read_files(ext, instance):
-    # List all the files
-    for file in os.listdir(ext):
-        [fname, type] = os.path.splitext(file)
-        
-        # For the selected instance
-        if (fname == instance):
-            if (type == ".graph"):
-                G = read_graph(ext + instance + type)
-            elif (type == ".txt"):
-                G = read_txt(ext + instance + type)
-            elif (type == ".gml"):
-                G = nx.read_gml(ext + instance + type, label="id")
-                G = nx.Graph(G)            
-            
-            return G
\ No newline at end of file
+    return load_graph(ext, instance).to_networkx()
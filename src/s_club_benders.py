@@ -0,0 +1,168 @@
+import sys
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+import callback
+import session
+from check_solution import check_solution
+from distance import DistanceIndex
+from power import gather_rows
+from s_club_centering import center_ranks
+
+# The master problem holds at most this many assignment variables X[v, j]. If all the vertices fit as
+# cluster centers, the master is exact; otherwise it is restricted to the centers of the bounds
+MAX_MASTER_VARIABLES = 2 * 10 ** 6
+
+
+# Assignment pairs (v, j) of the vertices v to the clusters j of T_star, with v in the ball of radius s around
+# the center j. For partitioning over all the vertices, the center of a cluster is its vertex of lowest rank
+# (see s_club_centering.py), so v also ranks after j
+def master_pairs(dist_index, T_star, rank, problem, exact):
+    T_star = np.asarray(T_star, dtype=np.int64)
+    counts = dist_index.ball_indptr[T_star + 1] - dist_index.ball_indptr[T_star]
+    v = gather_rows(dist_index.ball_indptr, dist_index.ball_indices, T_star).astype(np.int64)
+    j = np.repeat(T_star, counts)
+    if exact and problem == "Partitioning":
+        keep = rank[v] >= rank[j]
+        v, j = v[keep], j[keep]
+    return list(zip(v.tolist(), j.tolist()))
+
+
+# Cluster centers T_star of the master problem: all the vertices if their assignment variables fit within
+# max_variables, and otherwise the potential roots, the lowest-rank vertex of every heuristic cluster, and then
+# the other vertices by rank as long as they fit. Returns T_star and whether it holds all the vertices
+def master_centers(dist_index, rank, potential_roots, clusters, max_variables):
+    n = dist_index.n
+    ball_sizes = np.diff(dist_index.ball_indptr)
+    if ball_sizes.sum() <= max_variables:
+        return list(range(n)), True
+    order = list(potential_roots) + [min(cluster, key=lambda vertex: rank[vertex]) for cluster in clusters]
+    order += np.argsort(rank, kind="stable").tolist()
+    T_star = []
+    chosen = np.zeros(n, dtype=bool)
+    variables = 0
+    for j in order:
+        if chosen[j]: continue
+        # The potential roots and the heuristic centers are always kept, so that the warm start is feasible
+        if len(T_star) >= len(potential_roots) + len(clusters) and variables + ball_sizes[j] > max_variables:
+            break
+        T_star.append(j)
+        chosen[j] = True
+        variables += ball_sizes[j]
+    return T_star, False
+
+
+# Benders-style decomposition: the master problem opens clusters (Y[j] = 1), one for every center j of T_star,
+# and assigns every vertex to the open clusters around it (X[v, j] = 1, only for v within distance s of j). The
+# s-clubs are enforced by the connectivity and length-s separator cuts of callback.benders_callback, added
+# lazily on the master solutions. The potential roots open their own clusters, the master is warm-started from
+# the heuristic partition, and the cut_* arguments, the cut pool, the time limit and first_solution are used
+# as in s_club_ext_label.py, which returns the same values, followed by whether the master is exact.
+# Unless all the vertices fit as centers (see MAX_MASTER_VARIABLES), the master is restricted and its
+# solution only improves the upper bound; the lower bound is then the number of potential roots, and an
+# infeasible master does not prove that there is no solution with max_k clusters
+def solve_s_club_benders(G, s, potential_roots, clusters, max_k, problem, dist_index=None, threads=None,
+                         cut_nodes=callback.CUT_NODES, cut_rounds=callback.CUT_ROUNDS,
+                         cut_violation=callback.CUT_VIOLATION, pool=None, time_limit=3600, first_solution=False,
+                         max_variables=MAX_MASTER_VARIABLES):
+    # Distances up to s, shared with the callback
+    if dist_index is None:
+        dist_index = DistanceIndex.from_graph(G, s)
+    n = G.number_of_nodes()
+
+    # Initialize the model in the Gurobi session of this process (see session.py)
+    m = session.model("Benders", time_limit, threads)
+    if first_solution:
+        m.Params.SolutionLimit = 1
+
+    # Attach parameters to the model
+    callback.attach_graph(m, G, s, dist_index, cut_nodes, cut_rounds, cut_violation, pool)
+
+    # Select the clusters of the master problem
+    rank = center_ranks(n, potential_roots)
+    T_star, exact = master_centers(dist_index, rank, potential_roots, clusters, max_variables)
+    m._T_star = T_star
+    pairs = master_pairs(dist_index, T_star, rank, problem, exact)
+    print("Benders master problem:", len(T_star), "clusters,", len(pairs), "assignment variables,",
+          "exact" if exact else "restricted")
+
+    # Initialize the variables, with the clusters of the potential roots opened and holding their roots
+    roots = set(potential_roots)
+    m._X = m.addVars(pairs, vtype=GRB.BINARY, lb=[1 if v == j and v in roots else 0 for v, j in pairs])
+    m._Y = m.addVars(T_star, vtype=GRB.BINARY, lb=[1 if j in roots else 0 for j in T_star])
+    assignments = [[] for _ in range(n)]
+    for v, j in pairs:
+        assignments[v].append(j)
+
+    # Set the objective function: the number of open clusters
+    m.setObjective(gp.quicksum(m._Y[j] for j in T_star), GRB.MINIMIZE)
+
+    # Assignment constraints
+    if problem == "Partitioning":
+        m.addConstrs(gp.quicksum(m._X[v, j] for j in assignments[v]) == 1 for v in range(n))
+    else:
+        m.addConstrs(gp.quicksum(m._X[v, j] for j in assignments[v]) >= 1 for v in range(n))
+
+    # Coupling constraints: vertices are only assigned to open clusters
+    m.addConstrs(m._X[v, j] <= m._Y[j] for v, j in pairs)
+
+    # The heuristic solution has max_k clusters
+    m.addConstr(gp.quicksum(m._Y[j] for j in T_star) <= max_k)
+
+    # Separators found by earlier solves of this component, as lazy constraints for the clusters that both a
+    # and b can be assigned to
+    for key in list(m._pool.separators):
+        a, b, C = key
+        for j in set(assignments[a]).intersection(assignments[b]):
+            m.addConstr(m._X[a, j] + m._X[b, j] <= 1 + callback.separator_sum(m, C, j)).Lazy = 1
+            m._pool.preload(key, j)
+
+    ###########################################################################################
+    # Warm start the master problem with the clusters calculated by using heuristic.py
+    ###########################################################################################
+
+    # Every cluster goes to the cluster of T_star centered at its lowest-rank vertex that is not used yet
+    used = set()
+    for cluster in clusters:
+        candidates = sorted((vertex for vertex in cluster if vertex not in used and vertex in m._Y),
+                            key=lambda vertex: rank[vertex])
+        if not candidates: continue
+        center = candidates[0]
+        used.add(center)
+        m._Y[center].start = 1
+        for vertex in cluster:
+            if (vertex, center) in m._X:
+                m._X[vertex, center].start = 1
+
+    ###########################################################################################
+    # Solve the master problem and check the solution
+    ###########################################################################################
+
+    # Optimize the model
+    if cut_nodes > 0:
+        m.Params.PreCrush = 1
+    m.optimize(callback.benders_callback)
+    print(m._pool.summary())
+
+    # Read the solution and release the model
+    status = m.Status
+    clusters = None
+    if m.solCount > 0:
+        objective, bound = m.objVal, m.ObjBound if exact else len(potential_roots)
+        clusters = [[v for v in G.nodes if (v, j) in m._X and m._X[v, j].x > 0.5]
+                    for j in T_star if m._Y[j].x > 0.5]
+        clusters = [cluster for cluster in clusters if cluster]
+    m.dispose()
+
+    if clusters is not None:
+        # Check the solution
+        valid_solution = check_solution(G, s, clusters, problem)
+        if valid_solution:
+            return objective, bound, status, clusters, exact
+        else:
+            print("The obtained solution from solve_s_club_benders is invalid")
+            sys.exit()
+    else:
+        print("The Benders master problem has not found a feasible solution within the time limit, returning "
+              "the original lower and upper bounds")
+        return max_k, len(potential_roots), status, None, exact
@@ -0,0 +1,133 @@
+import sys
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+import callback
+import session
+from check_solution import check_solution
+from distance import DistanceIndex
+
+
+# Rank of every vertex in the choice of the centers: the potential roots first, in their order, then the
+# other vertices by index
+def center_ranks(n, potential_roots):
+    roots = set(potential_roots)
+    order = list(potential_roots) + [v for v in range(n) if v not in roots]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    return rank
+
+
+# Pairs (v, b) such that v can be assigned to the center b: v is in the ball of radius s around b. For
+# partitioning, the center of every cluster is its vertex of lowest rank, so v also ranks after b. The potential
+# roots are more than s apart, hence every cluster holds at most one of them, which is then its center
+def center_pairs(dist_index, rank, problem):
+    b = np.repeat(np.arange(dist_index.n, dtype=np.int64), np.diff(dist_index.ball_indptr))
+    v = dist_index.ball_indices.astype(np.int64)
+    if problem == "Partitioning":
+        keep = rank[v] >= rank[b]
+        v, b = v[keep], b[keep]
+    return list(zip(v.tolist(), b.tolist()))
+
+
+# The centering formulation: X[v, b] = 1 if v belongs to the s-club centered at b, and X[b, b] = 1 if b is a
+# center. The variables only exist for v within distance s of b, there is no cluster index to permute, and the
+# connectivity and length-s separator inequalities (5.c) are added by callback.centering_callback. The
+# potential roots are fixed as centers, and the cut_* arguments, the cut pool, the time limit and
+# first_solution are used as in s_club_ext_label.py, which returns the same values
+def solve_s_club_centering(G, s, potential_roots, clusters, max_k, problem, dist_index=None, threads=None,
+                           cut_nodes=callback.CUT_NODES, cut_rounds=callback.CUT_ROUNDS,
+                           cut_violation=callback.CUT_VIOLATION, pool=None, time_limit=3600, first_solution=False):
+    # Distances up to s, shared with the callback
+    if dist_index is None:
+        dist_index = DistanceIndex.from_graph(G, s)
+    n = G.number_of_nodes()
+
+    # Initialize the model in the Gurobi session of this process (see session.py)
+    m = session.model("centering", time_limit, threads)
+    if first_solution:
+        m.Params.SolutionLimit = 1
+
+    # Attach parameters to the model
+    callback.attach_graph(m, G, s, dist_index, cut_nodes, cut_rounds, cut_violation, pool)
+
+    # Initialize the variables, with the potential roots fixed as centers
+    rank = center_ranks(n, potential_roots)
+    pairs = center_pairs(dist_index, rank, problem)
+    roots = set(potential_roots)
+    m._X = m.addVars(pairs, vtype=GRB.BINARY, lb=[1 if v == b and v in roots else 0 for v, b in pairs])
+    assignments = [[] for _ in range(n)]
+    for v, b in pairs:
+        assignments[v].append(b)
+
+    # Set the objective function: the number of centers
+    m.setObjective(gp.quicksum(m._X[b, b] for b in range(n)), GRB.MINIMIZE)
+
+    # Assignment constraints
+    if problem == "Partitioning":
+        m.addConstrs(gp.quicksum(m._X[v, b] for b in assignments[v]) == 1 for v in range(n))
+    else:
+        m.addConstrs(gp.quicksum(m._X[v, b] for b in assignments[v]) >= 1 for v in range(n))
+
+    # Coupling constraints: only centers have vertices assigned to them
+    m.addConstrs(m._X[v, b] <= m._X[b, b] for v, b in pairs if v != b)
+
+    # The heuristic solution has max_k clusters
+    m.addConstr(gp.quicksum(m._X[b, b] for b in range(n)) <= max_k)
+
+    # Separators found by earlier solves of this component - (5.c), as lazy constraints for the centers that
+    # both a and b can be assigned to
+    for key in list(m._pool.separators):
+        a, b, C = key
+        for center in set(assignments[a]).intersection(assignments[b]):
+            m.addConstr(m._X[a, center] + m._X[b, center] <=
+                        m._X[center, center] + callback.separator_sum(m, C, center)).Lazy = 1
+            m._pool.preload(key, center)
+
+    ###########################################################################################
+    # Warm start MIP with the clusters calculated by using heuristic.py
+    ###########################################################################################
+
+    # The center of every cluster is its vertex of lowest rank (its potential root, if any) that is not the
+    # center of another cluster yet
+    centers = set()
+    for cluster in clusters:
+        candidates = sorted((vertex for vertex in cluster if vertex not in centers), key=lambda vertex: rank[vertex])
+        if not candidates: continue
+        center = candidates[0]
+        centers.add(center)
+        for vertex in cluster:
+            if (vertex, center) in m._X:
+                m._X[vertex, center].start = 1
+
+    ###########################################################################################
+    # Solve the MIP and check the solution
+    ###########################################################################################
+
+    # Optimize the model
+    if cut_nodes > 0:
+        m.Params.PreCrush = 1
+    m.optimize(callback.centering_callback)
+    print(m._pool.summary())
+
+    # Read the solution and release the model
+    status = m.Status
+    clusters = None
+    if m.solCount > 0:
+        objective, bound = m.objVal, m.ObjBound
+        clusters = [[v for v in G.nodes if (v, b) in m._X and m._X[v, b].x > 0.5]
+                    for b in range(n) if m._X[b, b].x > 0.5]
+    m.dispose()
+
+    if clusters is not None:
+        # Check the solution
+        valid_solution = check_solution(G, s, clusters, problem)
+        if valid_solution:
+            return objective, bound, status, clusters
+        else:
+            print("The obtained solution from solve_s_club_centering is invalid")
+            sys.exit()
+    else:
+        print("The centering model has not found a feasible solution within the time limit, returning "
+              "the original lower and upper bounds")
+        return max_k, len(potential_roots), status, None
@@ -1,32 +1,57 @@
 import sys
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
-import networkx as nx
 import callback
+import session
 from check_solution import check_solution
+from distance import DistanceIndex
+from power import gather_rows
 
 
-# The implementation of the extended labeling formulation in section 4 with the
-# diameter-bounding constraint being inequality (10) in section 4.1
-def solve_s_club_ext_label(G, s, potential_roots, clusters, max_k, problem):
-    # Calculate power graph and its complement
-    H = nx.power(G, s)
-    H_c = nx.complement(H)
+# Bounds of the variables X[v, j] as (n, max_k) arrays. One-fixing: the potential root j has label j.
+# Zero-fixing: the vertices farther than s from the potential root j, i.e., outside its ball in the
+# distance index, cannot have label j
+def root_bounds(dist_index, potential_roots, max_k):
+    roots = np.asarray(potential_roots, dtype=np.int64)
+    lb = np.zeros((dist_index.n, max_k))
+    ub = np.zeros((dist_index.n, max_k))
+    ub[:, len(roots):] = 1
+    counts = dist_index.ball_indptr[roots + 1] - dist_index.ball_indptr[roots]
+    in_ball = gather_rows(dist_index.ball_indptr, dist_index.ball_indices, roots)
+    ub[in_ball, np.repeat(np.arange(len(roots)), counts)] = 1
+    lb[roots, np.arange(len(roots))] = 1
+    return lb, ub
 
-    # Initialize the model
-    m = gp.Model()
 
-    # Set the time limit
-    m.Params.TimeLimit = 3600
+# The implementation of the extended labeling formulation in section 4 with the
+# diameter-bounding constraint being inequality (10) in section 4.1. The cut_* arguments are the limits
+# of the user cuts separated on fractional solutions (see callback.py), and the separators already in the
+# cut pool (see cutpool.py) are added as lazy constraints when the model is built. With first_solution, the
+# solve stops at the first solution with at most max_k clusters. Returns the objective value, the bound, the
+# status and the clusters of the solution (None if there is none)
+def solve_s_club_ext_label(G, s, potential_roots, clusters, max_k, problem, dist_index=None, threads=None,
+                           cut_nodes=callback.CUT_NODES, cut_rounds=callback.CUT_ROUNDS,
+                           cut_violation=callback.CUT_VIOLATION, pool=None, time_limit=3600, first_solution=False):
+    # Distances up to s, shared with the callback
+    if dist_index is None:
+        dist_index = DistanceIndex.from_graph(G, s)
+
+    # Initialize the model in the Gurobi session of this process (see session.py)
+    m = session.model("ext_label", time_limit, threads)
+    if first_solution:
+        m.Params.SolutionLimit = 1
 
     # Attach parameters to the model
-    m._graph = G
-    m._s = s
+    callback.attach_graph(m, G, s, dist_index, cut_nodes, cut_rounds, cut_violation, pool)
     m._k = max_k
 
-    # Initialize the variables - (10.f)
-    m._X = m.addVars(G.nodes, range(max_k), vtype=GRB.BINARY)
-    m._Y = m.addVars(range(max_k), vtype=GRB.CONTINUOUS)
+    # Initialize the variables - (10.f), with the bounds of the fixing procedures below. The bounds are
+    # listed in the order of the variables (v, j), i.e., row by row
+    X_lb, X_ub = root_bounds(dist_index, potential_roots, max_k)
+    m._X = m.addVars(G.nodes, range(max_k), vtype=GRB.BINARY, lb=X_lb.ravel().tolist(), ub=X_ub.ravel().tolist())
+    m._Y = m.addVars(range(max_k), vtype=GRB.CONTINUOUS,
+                     lb=[1 if j < len(potential_roots) else 0 for j in range(max_k)])
 
     # Set the objective function - (10.a)
     m.setObjective(gp.quicksum(m._Y), GRB.MINIMIZE)
@@ -37,28 +62,28 @@ def solve_s_club_ext_label(G, s, potential_roots, clusters, max_k, problem):
     else:
         m.addConstrs(gp.quicksum(m._X[v, j] for j in range(max_k)) >= 1 for v in G.nodes)
 
-    # Coupling constraints - (10.c)
-    m.addConstrs(m._X[v, j] <= m._Y[j] for v in G.nodes for j in range(max_k))
+    # Coupling constraints - (10.c), except for the variables fixed to zero
+    free_v, free_j = np.nonzero(X_ub)
+    m.addConstrs(m._X[v, j] <= m._Y[j] for v, j in zip(free_v.tolist(), free_j.tolist()))
 
     # Sequential constraints - (10.d)
     m._Y[0].ub = 1
     m.addConstrs(m._Y[j] >= m._Y[j + 1] for j in range(max_k - 1))
 
+    # Separators found by earlier solves of this component - (3.d), as lazy constraints for the labels that
+    # both a and b can take
+    for key in list(m._pool.separators):
+        a, b, C = key
+        for j in np.flatnonzero(X_ub[a] * X_ub[b]).tolist():
+            m.addConstr(m._X[a, j] + m._X[b, j] <= m._Y[j] + gp.quicksum(m._X[c, j] for c in C)).Lazy = 1
+            m._pool.preload(key, j)
+
     ###########################################################################################
     # Fixing and ordering procedures
     ###########################################################################################
-    # One-fixing
-    for j in range(len(potential_roots)):
-        m._Y[j].lb = 1
-        m._X[potential_roots[j], j].lb = 1
-    for j in range(len(potential_roots)):
-        m._Y[j].lb = 1
-
-    # Zero-fixing
-    for j in range(len(potential_roots)):
-        for vertex in G.nodes:
-            if vertex in H_c.neighbors(potential_roots[j]):
-                m._X[vertex, j].ub = 0
+    # Both are applied through the bounds of the variables when they are created
+    # One-fixing: Y[j] = 1 and X[root_j, j] = 1 for the potential roots (see root_bounds)
+    # Zero-fixing: X[v, j] = 0 for the vertices v outside the ball of radius s around root_j (see root_bounds)
 
     ###########################################################################################
     # Warm start MIP with variable clusters calculated by using heuristic.py
@@ -75,9 +100,10 @@ def solve_s_club_ext_label(G, s, potential_roots, clusters, max_k, problem):
                     flag = True
                     for vertex in cluster:
                         m._X[vertex, j].start = 1
-            # If it's not, create a new one
+            # If it's not, create a new one, as long as there are labels left
             if not flag:
                 index_of_clusters += 1
+                if index_of_clusters >= max_k: continue
                 for vertex in cluster:
                     m._X[vertex, index_of_clusters].start = 1
 
@@ -86,16 +112,28 @@ def solve_s_club_ext_label(G, s, potential_roots, clusters, max_k, problem):
     ###########################################################################################
 
     # Optimize the model
-    m.Params.MIPFocus = 3
-    m.Params.lazyConstraints = 1
+    if cut_nodes > 0:
+        m.Params.PreCrush = 1
     m.optimize(callback.labeling_callback)
+    print(m._pool.summary())
 
+    # Read the solution and release the model
+    status = m.Status
+    clusters = None
     if m.solCount > 0:
-        # Check the solution
+        objective, bound = m.objVal, m.ObjBound
         clusters = [[vertex for vertex in G.nodes if m._X[vertex, j].x > 0.5] for j in range(max_k) if m._Y[j].x > 0.5]
+    m.dispose()
+
+    if clusters is not None:
+        # Check the solution
         valid_solution = check_solution(G, s, clusters, problem)
         if valid_solution:
-            return m.objVal, m.ObjBound, m.Status
+            return objective, bound, status, clusters
         else:
             print("The obtained solution from solve_s_club_ext_label is invalid")
-            sys.exit()
\ No newline at end of file
+            sys.exit()
+    else:
+        print("The ext_label model has not found a feasible solution within the time limit, returning "
+              "the original lower and upper bounds")
+        return max_k, len(potential_roots), status, None
@@ -1,83 +1,168 @@
 import gurobipy as gp
 from gurobipy import GRB
-import networkx as nx
 import sys
+import numpy as np
+from scipy.sparse import csr_matrix
 from check_solution import check_solution
-
-
-def solve_s_club_with_sasha(G, s, potential_roots, feasible_partitions, max_k, problem):
-    # Construct the s-power graph
-    H = nx.power(G, s)
-
-    # Calculate the distance between nodes, which will be used in the constraints
-    distance = {}
-    for i in G.nodes:
-        distance[i] = nx.single_source_dijkstra_path_length(G, i)
-
+from distance import DistanceIndex
+from power import gather_rows
+import session
+import callback
+
+
+# Sparse constraint block sum_c A[r, c] * v[c] (sense) rhs[r] over the variable vector v, given by the
+# coordinates (rows, cols, vals) of A. The rows are numbered 0, ..., count-1
+def constraint_block(rows, cols, vals, count, size, sense, rhs):
+    A = csr_matrix((np.asarray(vals, dtype=float), (rows, cols)), shape=(count, size))
+    return A, sense, np.broadcast_to(np.asarray(rhs, dtype=float), (count,))
+
+
+# Variables and constraints of the Sasha formulation (2) as sparse matrices over one variable vector v, made of
+# X (x(i, k) at i * max_k + k), then U, then Z. U holds u(i, j, l) only for the pairs i < j at distance d
+# between 1 and s, and only for the layers d <= l <= s (the other ones are zero). The assignments fixed by the
+# potential roots are set through the bounds of X, and the constraints they make redundant are left out.
+# Returns the variable layout together with (lb, ub, vtype, obj, blocks), where every block is (A, sense, rhs)
+def sasha_blocks(dist_index, s, potential_roots, max_k, problem):
+    n, K = dist_index.n, max_k
+    indptr, indices = dist_index.indptr, dist_index.indices
+
+    # Pairs i < j within distance s, sorted by (i, j), and the positions of their u-variables
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(dist_index.ball_indptr))
+    keep = rows < dist_index.ball_indices
+    pair_i, pair_j = rows[keep], dist_index.ball_indices[keep]
+    pair_d = dist_index.ball_dist[keep].astype(np.int64)
+    pair_keys = pair_i * n + pair_j
+    layers = s - pair_d + 1
+    u_base = n * K + np.concatenate([[0], np.cumsum(layers)[:-1]]).astype(np.int64)
+    z = n * K + int(layers.sum())
+    size = z + 1
+
+    # Bounds: the potential roots are fixed as independent s-clubs (X[root_k, k] = 1), and the vertices far
+    # away from the potential roots are not assigned to them (F_1)
+    lb = np.zeros(size)
+    ub = np.ones(size)
+    ub[z] = GRB.INFINITY
+    vtype = np.full(size, GRB.CONTINUOUS)
+    vtype[:n * K] = GRB.BINARY
+    obj = np.zeros(size)
+    obj[z] = 1
+    x_lb, x_ub = lb[:n * K].reshape(n, K), ub[:n * K].reshape(n, K)
+    for k, root in enumerate(potential_roots):
+        x_ub[:, k] = dist_index.distances_from(root) <= s
+        x_lb[root, k] = 1
+    free = x_ub > 0
+
+    blocks = []
+
+    # Add the assignment constraints - (2.b and 2.c)
+    i, k = np.nonzero(free)
+    blocks.append(constraint_block(np.concatenate([np.arange(len(i)), np.arange(len(i))]),
+                                   np.concatenate([np.full(len(i), z), i * K + k]),
+                                   np.concatenate([np.ones(len(i)), -(k + 1)]), len(i), size, GRB.GREATER_EQUAL, 0))
+    blocks.append(constraint_block(i, i * K + k, np.ones(len(i)), n, size,
+                                   GRB.EQUAL if problem == "Partitioning" else GRB.GREATER_EQUAL, 1))
+
+    # Add the s-club constraints - (2.d), for the pairs at distance 2 to s and the labels both can take
+    long_pairs = np.flatnonzero(pair_d >= 2)
+    p, k = np.nonzero(free[pair_i[long_pairs]] & free[pair_j[long_pairs]])
+    p = long_pairs[p]
+    r = np.arange(len(p))
+    blocks.append(constraint_block(np.concatenate([r, r, r]),
+                                   np.concatenate([pair_i[p] * K + k, pair_j[p] * K + k, u_base[p] + layers[p] - 1]),
+                                   np.concatenate([np.ones(2 * len(p)), -np.ones(len(p))]), len(p), size,
+                                   GRB.LESS_EQUAL, 1))
+
+    # Add the s-club constraints - (2.e), for the pairs farther than s apart. Labels fixed by a potential root
+    # are only free inside its ball, so most of these pairs only need the labels beyond the potential roots
+    far_i, far_j, far_k = [], [], []
+    for a in range(n):
+        far = np.ones(n, dtype=bool)
+        far[:a + 1] = False
+        far[dist_index.ball(a, s)] = False
+        b = np.flatnonzero(far)
+        pb, kb = np.nonzero(free[a] & free[b])
+        far_i.append(np.full(len(pb), a, dtype=np.int64))
+        far_j.append(b[pb])
+        far_k.append(kb)
+    far_i, far_j, far_k = np.concatenate(far_i), np.concatenate(far_j), np.concatenate(far_k)
+    r = np.arange(len(far_i))
+    blocks.append(constraint_block(np.concatenate([r, r]), np.concatenate([far_i * K + far_k, far_j * K + far_k]),
+                                   np.ones(2 * len(r)), len(r), size, GRB.LESS_EQUAL, 1))
+
+    # Add the u-variables continuity constraints - (2.f): for the pairs i < j at distance d >= 2 and d <= l <= s,
+    # u(i, j, l) <= sum of u({t, j}, l - 1) over the neighbors t of i with dist(t, j) <= l - 1
+    counts = indptr[pair_i[long_pairs] + 1] - indptr[pair_i[long_pairs]]
+    row_pair = np.repeat(long_pairs, counts)
+    t = gather_rows(indptr, indices, pair_i[long_pairs])
+    j = pair_j[row_pair]
+    dist_tj = dist_index.pair_dist(t, j).astype(np.int64)
+    useful = (t != j) & (dist_tj <= s - 1)
+    row_pair, t, j, dist_tj = row_pair[useful], t[useful], j[useful], dist_tj[useful]
+    other = np.searchsorted(pair_keys, np.minimum(t, j) * n + np.maximum(t, j))
+    # One entry per layer l from max(d, dist(t, j) + 1) to s
+    first = np.maximum(pair_d[row_pair], dist_tj + 1)
+    repeats = s - first + 1
+    entry_pair, entry_other = np.repeat(row_pair, repeats), np.repeat(other, repeats)
+    entry_l = np.repeat(first, repeats) + np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    continuity_layers = np.where(pair_d >= 2, layers, 0)
+    row_base = np.concatenate([[0], np.cumsum(continuity_layers)[:-1]]).astype(np.int64)
+    count = int(continuity_layers.sum())
+    own_pair = np.repeat(long_pairs, layers[long_pairs])
+    own_l = np.repeat(pair_d[long_pairs], layers[long_pairs]) + np.arange(len(own_pair)) - \
+        np.repeat(np.cumsum(layers[long_pairs]) - layers[long_pairs], layers[long_pairs])
+    blocks.append(constraint_block(
+        np.concatenate([row_base[own_pair] + own_l - pair_d[own_pair],
+                        row_base[entry_pair] + entry_l - pair_d[entry_pair]]),
+        np.concatenate([u_base[own_pair] + own_l - pair_d[own_pair],
+                        u_base[entry_other] + entry_l - 1 - pair_d[entry_other]]),
+        np.concatenate([np.ones(len(own_pair)), -np.ones(len(entry_pair))]), count, size, GRB.LESS_EQUAL, 0))
+
+    # Add the u-function restriction constraints - (2.g and 2.h), u(i, j, l) <= 1 - |x(i, k) - x(j, k)|, for the
+    # pairs within distance s and the labels one of them can take
+    p, k = np.nonzero(free[pair_i] | free[pair_j])
+    repeats = layers[p]
+    p, k = np.repeat(p, repeats), np.repeat(k, repeats)
+    u = u_base[p] + np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    r = np.arange(len(p))
+    for sign in [1, -1]:
+        blocks.append(constraint_block(np.concatenate([r, r, r]),
+                                       np.concatenate([u, pair_i[p] * K + k, pair_j[p] * K + k]),
+                                       np.concatenate([np.ones(len(r)), -sign * np.ones(len(r)),
+                                                       sign * np.ones(len(r))]),
+                                       len(r), size, GRB.LESS_EQUAL, 1))
+
+    return (lb, ub, vtype, obj, blocks), z
+
+
+# The Sasha formulation with max_k labels. The time limit and first_solution are used as in s_club_ext_label.py,
+# which returns the same values
+def solve_s_club_with_sasha(G, s, potential_roots, feasible_partitions, max_k, problem, dist_index=None, threads=None,
+                            time_limit=3600, first_solution=False):
+    # Calculate the distance between nodes, which will be used in the constraints. Distances larger
+    # than s are reported as s + 1
+    if dist_index is None:
+        dist_index = DistanceIndex.from_graph(G, s)
+    n = G.number_of_nodes()
+
+    # Initialize the model in the Gurobi session of this process (see session.py)
+    m = session.model("Sasha", time_limit, threads)
+    if first_solution:
+        m.Params.SolutionLimit = 1
     try:
-        m = gp.Model()
 
-        # set the time limit
-        m.Params.TimeLimit = 3600
-
-        # Create the variables
-        X = m.addVars(G.nodes, max_k, vtype=GRB.BINARY)
-        U = m.addVars(G.nodes, G.nodes, s + 1, lb=0.0, ub=1.0, vtype=GRB.CONTINUOUS)
-        Z = m.addVar(vtype=GRB.CONTINUOUS)
-
-        # Set the objetive function - (2.a)
-        m.setObjective(Z, GRB.MINIMIZE)
-
-        # Add the assignment constraints - (2.b and 2.c)
-        m.addConstrs(Z >= (k + 1) * X[i, k] for i in G.nodes for k in range(max_k))
-        if problem == "Partitioning":
-            m.addConstrs(gp.quicksum(X[i, k] for k in range(max_k)) == 1 for i in G.nodes)
-        else:
-            m.addConstrs(gp.quicksum(X[i, k] for k in range(max_k)) >= 1 for i in G.nodes)
-
-        for i in G.nodes:
-            for j in G.nodes:
-                if i < j:
-                    # Add the s-club constraints - (2.d and 2.e)
-                    m.addConstrs(
-                        X[i, k] + X[j, k] <= 1 + U[i, j, s] for k in range(max_k) if distance[i][j] in range(2, s + 1))
-                    m.addConstrs(X[i, k] + X[j, k] <= 1 for k in range(max_k) if distance[i][j] >= s + 1)
-
-                    # Add the u-variables continuity constraints - (2.f)
-                    m.addConstrs(U[i, j, l] <= gp.quicksum(
-                        U[t, j, l - 1] for t in G.neighbors(i) if (t < j and distance[j][t] <= l - 1)) + gp.quicksum(
-                        U[j, t, l - 1] for t in G.neighbors(i) if (j < t and distance[j][t] <= l - 1)) for l in
-                                 range(distance[i][j], s + 1) if distance[i][j] in range(2, s + 1))
-
-                    # Add the u-function restriction constraints - (2.g and 2.h)
-                    m.addConstrs(
-                        U[i, j, l] <= X[i, k] - X[j, k] + 1 for k in range(max_k) for l in range(distance[i][j], s + 1)
-                        if distance[i][j] in range(1, s + 1))
-                    m.addConstrs(
-                        U[i, j, l] <= X[j, k] - X[i, k] + 1 for k in range(max_k) for l in range(distance[i][j], s + 1)
-                        if distance[i][j] in range(1, s + 1))
-
-                    # Fix the u variables when l is out of (d_ij_G, s)
-                    for l in range(min(distance[i][j], s + 1)):
-                        U[i, j, l].ub = 0
-
-                else:
-                    # Fix the u variables to zero when j <= i
-                    for l in range(s + 1):
-                        U[i, j, l].ub = 0
-
-        # Fix the potential roots as independent s-clubs
-        for k in range(len(potential_roots)):
-            X[potential_roots[k], k].lb = 1
-
-        # Fix the assignment of the vertices far away from the potential roots to zero (F_1)
-        for k in range(len(potential_roots)):
-            for vertex in G.nodes:
-                if vertex not in H.neighbors(potential_roots[k]) and vertex != potential_roots[k]:
-                    X[vertex, k].ub = 0
+        # Create the variables and the constraint blocks - (2.a to 2.h)
+        (lb, ub, vtype, obj, blocks), z = sasha_blocks(dist_index, s, potential_roots, max_k, problem)
+        v = m.addMVar(len(lb), lb=lb, ub=ub, vtype=vtype, obj=obj)
+        m.ModelSense = GRB.MINIMIZE
+        for A, sense, rhs in blocks:
+            m.addMConstr(A, v, sense, rhs)
+        X = v[:n * max_k]
+        print("Sasha model size:", len(lb), "variables,", sum(A.shape[0] for A, _, _ in blocks), "constraints,",
+              sum(A.nnz for A, _, _ in blocks), "nonzeros")
 
         # Warm-start MIP with clusters (obtained by running heuristic.py)
         # Start the warm-start with nodes belong to partitions containing potential root
+        start = np.full(n * max_k, GRB.UNDEFINED)
         partition_index = len(potential_roots)
         if len(feasible_partitions) != 0:
             for partition in feasible_partitions:
@@ -88,42 +173,50 @@ def solve_s_club_with_sasha(G, s, potential_roots, feasible_partitions, max_k, p
                     if potential_roots[j] in partition:
                         flag = True
                         for vertex in partition:
-                            X[vertex, j].start = 1
+                            start[vertex * max_k + j] = 1
                             print("Assign vertex", vertex, "to partition", j)
 
-                # Else, assign all vertices to the same partition labeled by partition_index
-                if not flag:
+                # Else, assign all vertices to the same partition labeled by partition_index, as long as there
+                # are labels left
+                if not flag and partition_index < max_k:
                     for vertex in partition:
-                        X[vertex, partition_index].start = 1
+                        start[vertex * max_k + partition_index] = 1
                         print("Assign vertex", vertex, "to partition", partition_index)
                     partition_index += 1
+        X.Start = start
 
-        m.Params.lazyConstraints = 1
-        m.optimize()
+        m.optimize(callback.stop_callback)
 
     # Handle the out-of-memory exception
     except gp.GurobiError as e:
         if e.errno == 10005:  # Error code for out-of-memory
             print("Out of memory error encountered, taking the best incumbent solution")
 
-    # Construct the final partition if there is at least one feasible solution found
-    if m.Status in [GRB.OPTIMAL, GRB.SUBOPTIMAL]:
+    # Construct the final partition if there is at least one feasible solution found (also when the solve
+    # stopped at the time or solution limit), then release the model
+    status = m.Status
+    final_clusters = None
+    if m.SolCount > 0:
+        objective, bound = m.objVal, m.ObjBound
+        xval = X.X.reshape(n, max_k)
         final_clusters = []
-        for k in range(round(Z.x)):
+        for k in range(round(v.X[z])):
             cluster = []
             for i in G.nodes:
-                if X[i, k].x >= 0.9:
+                if xval[i, k] >= 0.9:
                     cluster.append(i)
             final_clusters.append(cluster)
+    m.dispose()
 
+    if final_clusters is not None:
         # Check the solution
         valid_solution = check_solution(G, s, final_clusters, problem)
         if valid_solution:
-            return m.objVal, m.ObjBound, m.Status
+            return objective, bound, status, [cluster for cluster in final_clusters if cluster]
         else:
             print("The solution obtained from solve_s_club_with_sasha is invalid")
             sys.exit()
     else:
         print("The Sasha model has not found a feasible solution within the time limit, returning"
               "the original lower and upper bounds")
-        return max_k, len(potential_roots), m.Status
+        return max_k, len(potential_roots), status, None
@@ -0,0 +1,316 @@
+import os
+import math
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from gurobipy import GRB
+import budget
+import cache
+import callback
+import cutpool
+import heuristic
+import lb
+import s_club_ext_label
+import s_club_centering
+import s_club_benders
+import sasha
+import small
+import isomorphism
+import search
+
+
+# Cache mode of the upper bound heuristic. For odd s, it also depends on the candidate cliques
+def UB_cache_mode(s, UB_mode, config):
+    if s % 2 == 0:
+        return UB_mode
+    return "_".join([UB_mode, "cap" + str(config.get('Clique Cap')), config.get('Clique Sampling', "first")])
+
+
+# Solve the model base of a component with max_k labels (see s_club_ext_label.py for the other arguments and
+# the returned values), and return whether the model is exact after these values: only a restricted Benders
+# master (see s_club_benders.py) is not. pool is the cut pool of the models with callbacks
+def solve_model(base, G, s, potential_roots, clusters, max_k, problem, dist_index, threads, config, pool,
+                time_limit=search.TIME_LIMIT, first_solution=False):
+    if base == "Sasha":
+        return sasha.solve_s_club_with_sasha(G, s, potential_roots, clusters, max_k, problem, dist_index, threads,
+                                             time_limit, first_solution) + (True,)
+    cut_arguments = (config.get('Cut Nodes', callback.CUT_NODES), config.get('Cut Rounds', callback.CUT_ROUNDS),
+                     config.get('Cut Violation', callback.CUT_VIOLATION), pool, time_limit, first_solution)
+    if base == "Benders":
+        return s_club_benders.solve_s_club_benders(G, s, potential_roots, clusters, max_k, problem, dist_index,
+                                                   threads, *cut_arguments)
+    solve = {"ext_label": s_club_ext_label.solve_s_club_ext_label,
+             "centering": s_club_centering.solve_s_club_centering}[base]
+    return solve(G, s, potential_roots, clusters, max_k, problem, dist_index, threads, *cut_arguments) + (True,)
+
+
+# Lower and upper bounds of one connected component. subgraph is the CSRGraph of the component (vertices
+# labeled 0, ..., n-1), and bound_key is the cache key (graph key, component index) of its bounds, which are
+# shared by all the models and problems. Without a time limit, the bounds get lb.TIME_LIMIT and
+# heuristic.TIME_LIMIT; with one, the lower bound gets its LB_SHARE (see budget.py) and the upper bound the
+# rest, both within these limits. Their IPs use threads Gurobi threads. Returns the bounds of the component
+# together with its timings, the potential roots and the heuristic partition
+def bound_component(subgraph, dist_index, s, problem, UB_mode, config, bound_key, time_limit=None, threads=None):
+    component_start = time.time()
+    G = subgraph.to_networkx()
+    result = {"|V|": G.number_of_nodes()}
+    LB_time_limit = lb.TIME_LIMIT
+    if time_limit is not None:
+        LB_time_limit = min(LB_time_limit, time_limit * budget.LB_SHARE / (budget.LB_SHARE + budget.UB_SHARE))
+
+    # Lower bound
+    print("Starting the lower bound calculation")
+    H = dist_index.power_adjacency(s)
+    start_indep_set = time.time()
+    LB_mode = config.get('LB Mode', "IP")
+    cached = cache.load_bound(*bound_key, s, "LB", LB_mode, LB_time_limit)
+    if cached is not None:
+        potential_roots = cached[0][0]
+    else:
+        potential_roots, status = lb.find_max_indep_set(H, LB_time_limit, LB_mode, threads)
+        if status in [None, GRB.OPTIMAL, GRB.TIME_LIMIT]:
+            cache.save_bound(*bound_key, s, "LB", LB_mode, [potential_roots], status, status == GRB.OPTIMAL,
+                             LB_time_limit)
+    stop_indep_set = time.time()
+    result["LB Time"] = round(stop_indep_set - start_indep_set, 2)
+    result["LB"] = len(potential_roots)
+
+    # Upper bound, with the time left by the lower bound
+    print("Starting the upper bound calculation through heuristic")
+    start_heur = time.time()
+    UB_time_limit = heuristic.TIME_LIMIT
+    if time_limit is not None:
+        UB_time_limit = min(UB_time_limit, max(0, time_limit - (start_heur - component_start)))
+    UB_mode_key = UB_cache_mode(s, UB_mode, config)
+    cached = cache.load_bound(*bound_key, s, "UB", UB_mode_key, UB_time_limit)
+    if cached is not None:
+        feasible_partitions = cached[0]
+    else:
+        if s % 2 == 0:
+            feasible_partitions, status = heuristic.calculate_UB_even(G, s, UB_mode, problem, dist_index,
+                                                                      UB_time_limit, threads)
+        else:
+            feasible_partitions, status = heuristic.calculate_UB_odd(G, s, UB_mode, problem, dist_index,
+                                                                     config.get('Clique Cap'),
+                                                                     config.get('Clique Sampling', "first"),
+                                                                     UB_time_limit, threads)
+        cache.save_bound(*bound_key, s, "UB", UB_mode_key, feasible_partitions, status,
+                         status is None or status == GRB.OPTIMAL, UB_time_limit)
+    finish_heur = time.time()
+    result["UB Time"] = finish_heur - start_heur
+    result["UB"] = len(feasible_partitions)
+
+    # The optimal value is found if LB = UB
+    if problem != "LB+UB" and result["LB"] == result["UB"]:
+        print("LB = UB in this iteration, and the optimal is found")
+        result["Objective Value"] = result["LB"]
+        result["Objective Bound"] = result["LB"]
+
+    result["Time"] = time.time() - component_start
+    return result, potential_roots, feasible_partitions
+
+
+# Solve the exact model of a component with the bounds of bound_component, within time_limit, using threads
+# Gurobi threads. Returns the result of bound_component completed with the objective value and bound
+def solve_component(subgraph, dist_index, s, problem, base, config, bound_key, threads, result, potential_roots,
+                    feasible_partitions, time_limit=search.TIME_LIMIT):
+    component_start = time.time()
+    G = subgraph.to_networkx()
+    if base not in ["ext_label", "Sasha", "centering", "Benders"]:
+        print("Please enter a correct base model")
+        sys.exit()
+    # The cut pool of the component, shared by all the models, problems and warm starts
+    on_disk = config.get('Cut Pool', "disk") == "disk"
+    pool = cutpool.CutPool.load(*bound_key, s) if on_disk else cutpool.CutPool()
+
+    # Solve the s-club problem with the selected model, either once with UB labels or by searching
+    # over the number of clusters with k-sized models
+    search_mode = config.get('Search', "off")
+    if search_mode == "off":
+        opt_obj, obj_bound, status, _, _ = solve_model(base, G, s, potential_roots, feasible_partitions, result["UB"],
+                                                    problem, dist_index, threads, config, pool, time_limit)
+    else:
+        opt_obj, obj_bound, status = search.search_k(
+            lambda k, clusters, time_limit: solve_model(base, G, s, potential_roots, clusters, k, problem,
+                                                        dist_index, threads, config, pool, time_limit, True),
+            result["LB"], result["UB"], feasible_partitions, search_mode,
+            config.get('Probe Time Limit', search.PROBE_TIME_LIMIT), time_limit, budget.stopped)
+    if on_disk and base != "Sasha":
+        pool.save(*bound_key, s)
+    result = dict(result)
+    result["Objective Value"] = opt_obj
+    result["Objective Bound"] = max(obj_bound, result["LB"])
+    result["Time"] += time.time() - component_start
+    return result
+
+
+# Whether the component result solves its problem to optimality (the objective value is an integer)
+def optimal(result):
+    return "Objective Value" in result and math.ceil(result["Objective Bound"] - 1e-6) >= result["Objective Value"]
+
+
+# Gurobi threads of every one of the given number of workers: the "Threads" budget (by default, all the CPUs
+# if there are several workers) split evenly across them, or the Gurobi default (None) for a single worker
+# without a budget
+def worker_threads(config, workers):
+    threads = config.get('Threads')
+    if threads is None and workers > 1:
+        threads = os.cpu_count() or 1
+    if threads is not None:
+        threads = max(1, threads // workers)
+    return threads
+
+
+# Run function(*arguments(c, time_limit)) for the components c in order, at most workers at a time, and
+# call finished(c, value) in this process as each one finishes. The time limit of a component is
+# time_limit(c, pending) when it starts, where pending lists the components not started yet (c included),
+# and no component is started once stop() holds. Workers are forked; where fork is not available, or with a
+# single worker, the components are run one at a time in this process
+def run_tasks(order, function, arguments, time_limit, finished, workers, stop=lambda: False):
+    pending = list(order)
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        while pending and not stop():
+            c = pending[0]
+            finished(c, function(*arguments(c, time_limit(c, pending))))
+            pending.pop(0)
+        return
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+        while pending or running:
+            while pending and len(running) < workers and not stop():
+                c = pending[0]
+                running[executor.submit(function, *arguments(c, time_limit(c, pending)))] = c
+                pending.pop(0)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished(running.pop(future), future.result())
+
+
+# Solve all the components: the ones with a closed-form solution (see small.py) or a known isomorphic
+# component (see isomorphism.py) in this process, and the other ones in a pool of worker processes (see
+# run_tasks), one per isomorphism class, in two phases: first the bounds of all of them, largest first, and
+# then the exact models of the ones with a gap, the largest gap first (see budget.priority). The total budget
+# of Gurobi threads is split evenly across the workers of every phase (see worker_threads). The exact models
+# stop once the summed bound of the components meets their summed incumbent, or is within the relative
+# "Instance Gap" of it. With the optional key "Time Limit", the components share a wall-clock budget (see
+# budget.py): the time of every phase goes to its components in proportion to their size or weight as they
+# start. Returns the results of solve_component in the order of components
+def solve_components(graph_key, graph, components, dist_indices, s, problem, base, UB_mode, config):
+    # The components with a closed-form solution, or isomorphic to a component solved before, are solved
+    # right away. Components of diameter at most s are cheaper to recognize than to look up. LB+UB measures
+    # the bounds themselves, so only the components of diameter at most s (where both bounds are 1) skip them
+    isomorphism_cache = config.get('Isomorphism Cache', "memory")
+    on_disk = isomorphism_cache == "disk"
+    subgraphs = [graph.subgraph(component) for component in components]
+    results = [None] * len(components)
+    for c, subgraph in enumerate(subgraphs):
+        start = time.time()
+        if problem == "LB+UB" and not small.diameter_at_most_s(dist_indices[c]): continue
+        lookup = isomorphism_cache != "off" and subgraph.n <= isomorphism.ISOMORPHISM_LIMIT and \
+            not small.diameter_at_most_s(dist_indices[c])
+        if lookup:
+            values = isomorphism.RESULTS.lookup(subgraph.to_networkx(), s, on_disk)
+            results[c] = small.result_from_values(subgraph.n, values, problem, start)
+            if results[c] is not None: continue
+        values = small.closed_form_values(subgraph, dist_indices[c], s)
+        if values is None: continue
+        results[c] = small.result_from_values(subgraph.n, values, problem, start)
+        if lookup:
+            isomorphism.RESULTS.store(subgraph.to_networkx(), s, values, on_disk)
+    remaining = [c for c in range(len(components)) if results[c] is None]
+    print(len(components) - len(remaining), "of", len(components), "components solved in closed form")
+
+    # Of the pending components isomorphic to each other, only one representative is solved, and the others
+    # take its bounds (with its potential roots and heuristic partition mapped onto them) and results
+    members = {}
+    if isomorphism_cache != "off" and problem != "LB+UB":
+        classes = isomorphism.isomorphism_classes({c: subgraphs[c].to_networkx() for c in remaining
+                                                   if subgraphs[c].n <= isomorphism.ISOMORPHISM_LIMIT})
+        members = {representative: copies for representative, copies in classes if copies}
+        copied = {member for copies in members.values() for member, _ in copies}
+        remaining = [c for c in remaining if c not in copied]
+        print(len(copied), "components solved as isomorphic copies of others")
+
+    # Results of the copies of component c: the values of c, without its timings
+    def copy_result(c):
+        for member, _ in members.get(c, []):
+            results[member] = dict(results[c], **{"LB Time": 0, "UB Time": 0, "Time": 0})
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(config.get('Workers', cpus), len(remaining)))
+    time_limit = config.get('Time Limit')
+    instance_budget = None
+    if time_limit is not None:
+        instance_budget = budget.Budget(time_limit, problem != "LB+UB")
+
+    # Bounds of the components, largest first
+    order = sorted(remaining, key=lambda c: len(components[c]), reverse=True)
+    threads = worker_threads(config, workers)
+    bounds = {}
+
+    def bound_time_limit(c, pending):
+        if instance_budget is None:
+            return None
+        return instance_budget.share(len(components[c]), sum(len(components[d]) for d in pending), workers,
+                                     instance_budget.bound_deadline)
+
+    def bound_finished(c, value):
+        results[c], bounds[c] = value[0], value[1:]
+        copy_result(c)
+        for member, mapping in members.get(c, []):
+            cache.map_bound(graph_key, c, member, s, "LB", config.get('LB Mode', "IP"), mapping)
+            cache.map_bound(graph_key, c, member, s, "UB", UB_cache_mode(s, UB_mode, config), mapping)
+
+    run_tasks(order, bound_component,
+              lambda c, limit: (subgraphs[c], dist_indices[c], s, problem, UB_mode, config, (graph_key, c), limit,
+                                threads),
+              bound_time_limit, bound_finished, workers)
+
+    # Exact models of the components with a gap, by priority, until the instance is closed or out of time
+    if problem != "LB+UB":
+        budget.start_instance()
+        instance_gap = config.get('Instance Gap', 0)
+        if budget.closed(results, instance_gap):
+            budget.STOP.set()
+        order = sorted((c for c in remaining if "Objective Value" not in results[c]),
+                       key=lambda c: budget.priority(results[c]), reverse=True)
+        exact_workers = max(1, min(workers, len(order)))
+        threads = worker_threads(config, exact_workers)
+
+        def exact_time_limit(c, pending):
+            if instance_budget is None:
+                return search.TIME_LIMIT
+            return instance_budget.share(budget.weight(results[c]), sum(budget.weight(results[d]) for d in pending),
+                                         exact_workers, instance_budget.deadline)
+
+        def exact_finished(c, value):
+            results[c] = value
+            copy_result(c)
+            if budget.closed(results, instance_gap):
+                budget.STOP.set()
+
+        def exact_stop():
+            return budget.stopped() or (instance_budget is not None and instance_budget.expired())
+
+        run_tasks(order, solve_component,
+                  lambda c, limit: (subgraphs[c], dist_indices[c], s, problem, base, config, (graph_key, c), threads,
+                                    results[c], *bounds[c], limit),
+                  exact_time_limit, exact_finished, exact_workers, exact_stop)
+
+        # The components left without a model keep their bounds
+        for c in order:
+            if "Objective Value" not in results[c]:
+                results[c]["Objective Value"] = results[c]["UB"]
+                results[c]["Objective Bound"] = results[c]["LB"]
+                copy_result(c)
+
+    # Record the optimal values found for small components
+    if isomorphism_cache != "off":
+        for c in remaining:
+            if subgraphs[c].n <= isomorphism.ISOMORPHISM_LIMIT and optimal(results[c]):
+                isomorphism.RESULTS.store(subgraphs[c].to_networkx(), s, {problem: results[c]["Objective Value"]},
+                                          on_disk)
+    return results
@@ -0,0 +1,55 @@
+import time
+import math
+from gurobipy import GRB
+
+# Modes of the search over the number of clusters k: a single model with UB labels, binary search, or
+# descending search from UB - 1
+SEARCH_MODES = ["off", "binary", "descending"]
+
+# Time limits (in seconds) of every probe and of the whole search of a component
+PROBE_TIME_LIMIT = 600
+TIME_LIMIT = 3600
+
+
+# Smallest number of clusters k between LB and UB such that a solution with at most k clusters exists, found by
+# probing k-sized models. probe(k, clusters, time_limit) solves the model with k labels warm-started from the
+# clusters, stopping at its first solution, and returns (value, bound, status, clusters) as the solvers do,
+# followed by whether its model is exact (see scheduler.solve_model). A probe that finds a solution lowers UB
+# to its number of clusters, and its clusters are the warm start of the next probes; an infeasible probe of an
+# exact model raises LB to k + 1. If a probe runs out of time, or its restricted model is infeasible, binary
+# search goes on with the larger k, and descending search stops. The search also stops once stop() holds
+# (see budget.py). Returns the best value, the bound and the status
+def search_k(probe, LB, UB, clusters, mode, probe_time_limit=PROBE_TIME_LIMIT, time_limit=TIME_LIMIT, stop=None):
+    start = time.time()
+    # k < lower is infeasible, k >= upper is feasible, and the values below next are not probed anymore
+    lower, upper, next_k = LB, UB, LB
+    status = GRB.OPTIMAL
+    while next_k < upper:
+        remaining = time_limit - (time.time() - start)
+        if remaining <= 0:
+            status = GRB.TIME_LIMIT
+            break
+        if stop is not None and stop():
+            status = GRB.INTERRUPTED
+            break
+        k = (next_k + upper) // 2 if mode == "binary" else upper - 1
+        print("Probing k =", k, "between", lower, "and", upper)
+        value, bound, probe_status, found, exact = probe(k, clusters, min(probe_time_limit, remaining))
+        if found is not None:
+            upper = len(found)
+            clusters = found
+            # The bound of the k-sized model holds for all the solutions with at most k clusters
+            lower = max(lower, min(math.ceil(bound - 1e-6), upper))
+        elif probe_status == GRB.INFEASIBLE and exact:
+            lower = k + 1
+        elif mode == "binary":
+            status = GRB.TIME_LIMIT
+            next_k = k + 1
+            continue
+        else:
+            status = GRB.TIME_LIMIT
+            break
+        next_k = max(next_k, lower)
+    if lower >= upper:
+        status = GRB.OPTIMAL
+    return upper, lower, status
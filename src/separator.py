@@ -0,0 +1,118 @@
+import numpy as np
+from power import gather_rows, truncated_bfs
+
+
+# Minimal length-s a,b-separators of a graph given by its CSR adjacency and distance index (see
+# distance.DistanceIndex). The graph is never modified: vertices are "removed" through the boolean
+# mask self.removed, and the scratch arrays below are reset after every call.
+class SeparatorEngine:
+    def __init__(self, dist_index):
+        self.dist = dist_index
+        self.indptr = dist_index.indptr
+        self.indices = dist_index.indices
+        self.s = dist_index.s
+        self.far = dist_index.s + 1
+        self.removed = np.zeros(dist_index.n, dtype=bool)
+        self.visited = np.zeros(dist_index.n, dtype=bool)
+        # Distances (truncated at s) from a and from b in the graph minus the removed vertices
+        self.dist_a = np.full(dist_index.n, self.far, dtype=np.int64)
+        self.dist_b = np.full(dist_index.n, self.far, dtype=np.int64)
+
+    # This function is an implementation of Algorithm 1 from "Thinning out Steiner trees:
+    # a node-based model for uniform edge costs". The vertices of component are given as an array
+    def fischetti_separator(self, component, b):
+        indptr, indices = self.indptr, self.indices
+        visited, boundary = self.visited, self.removed
+
+        # Find component boundary
+        visited[component] = True
+        neighbors = gather_rows(indptr, indices, component)
+        neighbors_component = np.unique(neighbors[~visited[neighbors]])
+        visited[component] = False
+        boundary[neighbors_component] = True
+
+        # Start Breadth-First Search (BFS)
+        visited[b] = True
+        child = np.array([b], dtype=np.int64)
+        reached = [child]
+        while len(child):
+            # Child becomes the parent, and the boundary vertices are not searched past
+            parent = child[~boundary[child]]
+
+            # Search for new children
+            child = gather_rows(indptr, indices, parent)
+            child = np.unique(child[~visited[child]])
+            visited[child] = True
+            reached.append(child)
+
+        C = neighbors_component[visited[neighbors_component]]
+        visited[np.concatenate(reached)] = False
+        boundary[neighbors_component] = False
+
+        return C.tolist()
+
+    # Vertices w with outside[w] that lie on an a,b-path of length at most s. They form a length-s
+    # a,b-separator whenever a and b are more than s apart in the graph induced by the other vertices
+    def interval_separator(self, a, b, outside):
+        interval = self.dist.interval(a, b, self.s)
+        return interval[outside[interval]].tolist()
+
+    # Fill dist with the distances from source in the graph minus the removed vertices, truncated at
+    # depth s. Returns the reached vertices, which are the entries of dist to reset afterwards
+    def _layers(self, dist, source):
+        reached, layers = truncated_bfs(self.indptr, self.indices, source, self.s, self.removed)
+        dist[reached] = layers
+        return reached
+
+    # Distances in dist can only decrease once c is added back to the graph. Relax them starting
+    # from c, up to depth s, and return the vertices whose distance changed
+    def _relax(self, dist, c):
+        neighbors = self.indices[self.indptr[c]:self.indptr[c + 1]]
+        dist[c] = min(self.far, int(dist[neighbors].min(initial=self.far)) + 1)
+        frontier = np.array([c], dtype=np.int64)
+        touched = [frontier]
+        while len(frontier):
+            counts = self.indptr[frontier + 1] - self.indptr[frontier]
+            candidates = gather_rows(self.indptr, self.indices, frontier)
+            new = np.repeat(dist[frontier], counts) + 1
+            keep = ~self.removed[candidates] & (new < dist[candidates]) & (new <= self.s)
+            candidates, new = candidates[keep], new[keep]
+            np.minimum.at(dist, candidates, new)
+            frontier = np.unique(candidates)
+            touched.append(frontier)
+        return np.concatenate(touched)
+
+    # Make the length-s a,b-separator C minimal. With C removed from the graph, a and b are more than s
+    # apart, so every a,b-path of length at most s in the graph minus C \ {c} passes through c. Such a path
+    # exists exactly when dist_a(c) + dist_b(c) <= s, with both distances read off the two-sided layers
+    # from a and b. Then c is kept; otherwise c is dropped and the layers are relaxed from c.
+    def minimalize(self, C, a, b):
+        removed, dist_a, dist_b = self.removed, self.dist_a, self.dist_b
+        removed[C] = True
+        touched = [self._layers(dist_a, a), self._layers(dist_b, b)]
+        minC = []
+        for c in C:
+            neighbors = self.indices[self.indptr[c]:self.indptr[c + 1]]
+            through_c = int(dist_a[neighbors].min(initial=self.far)) + int(dist_b[neighbors].min(initial=self.far)) + 2
+            if through_c <= self.s:
+                # Keep c in C
+                minC.append(c)
+            else:
+                # Delete c from C. It was not needed in the cut C
+                removed[c] = False
+                touched.append(self._relax(dist_a, c))
+                touched.append(self._relax(dist_b, c))
+        removed[C] = False
+        touched = np.concatenate(touched)
+        dist_a[touched] = self.far
+        dist_b[touched] = self.far
+        return minC
+
+    # Minimal length-s a,b-separator between the component of a and the vertex b (not in the component)
+    def component_cut(self, component, a, b):
+        return self.minimalize(self.fischetti_separator(component, b), a, b)
+
+    # Minimal length-s a,b-separator made of vertices with outside[w], for a and b more than s apart
+    # in the graph induced by the other vertices
+    def interval_cut(self, a, b, outside):
+        return self.minimalize(self.interval_separator(a, b, outside), a, b)
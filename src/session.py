@@ -0,0 +1,51 @@
+import os
+import gurobipy as gp
+
+# Parameters of every model of the process (see configure)
+PARAMS = {"OutputFlag": 1}
+
+# Parameters of the kinds of models
+MODEL_PARAMS = {
+    "MIS": {"Presolve": 1},
+    "dominating set": {"Method": 3, "Presolve": 1},  # Concurrent method
+    "clique cover": {"Method": 3, "Presolve": 1},  # Concurrent method
+    "ext_label": {"MIPFocus": 3, "LazyConstraints": 1},
+    "centering": {"MIPFocus": 3, "LazyConstraints": 1},
+    "Benders": {"LazyConstraints": 1},
+    "Sasha": {"LazyConstraints": 1},
+}
+
+# Gurobi environment of this process, and the process that started it
+_env = None
+_env_pid = None
+
+
+# Gurobi environment of this process, started on first use. Worker processes are forked, so a process
+# does not use an environment inherited from its parent and starts its own instead
+def env():
+    global _env, _env_pid
+    if _env is None or _env_pid != os.getpid():
+        _env = gp.Env()
+        _env_pid = os.getpid()
+    return _env
+
+
+# Set parameters of every model created from now on in this process
+def configure(**params):
+    PARAMS.update(params)
+
+
+# New model of the given kind (a key of MODEL_PARAMS) in the environment of this process, with the parameters
+# of the process and of its kind, the time limit and the number of threads (the Gurobi default if None). The
+# caller disposes the model once its solution is read
+def model(kind, time_limit=None, threads=None):
+    m = gp.Model(env=env())
+    for name, value in PARAMS.items():
+        m.setParam(name, value)
+    for name, value in MODEL_PARAMS[kind].items():
+        m.setParam(name, value)
+    if time_limit is not None:
+        m.Params.TimeLimit = time_limit
+    if threads is not None:
+        m.Params.Threads = threads
+    return m
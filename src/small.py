@@ -0,0 +1,90 @@
+import time
+
+# Components with at most this many vertices are solved exactly by dynamic programming over vertex subsets
+SMALL_COMPONENT = 10
+
+
+# Whether the component with distance index dist_index (truncated at s) has diameter at most s, i.e.,
+# whether the ball of radius s around every vertex is the whole component
+def diameter_at_most_s(dist_index):
+    return int(dist_index.ball_indptr[-1]) == dist_index.n * dist_index.n
+
+
+# Whether the vertex set S (a bitmask) induces a subgraph of diameter at most s. adjacency[v] is the
+# bitmask of the neighbors of v
+def is_s_club(adjacency, S, s):
+    vertices = [v for v in range(len(adjacency)) if S >> v & 1]
+    for v in vertices:
+        reached = 1 << v
+        for _ in range(s):
+            frontier = reached
+            for u in vertices:
+                if frontier >> u & 1:
+                    reached |= adjacency[u] & S
+            if reached == frontier: break
+        if reached != S:
+            return False
+    return True
+
+
+# Minimum number of s-clubs covering and partitioning the small graph with CSR adjacency (indptr, indices).
+# Every vertex subset is checked for being an s-club (or a subset of one), and the optimal covers and
+# partitions of the subsets are computed by dynamic programming: the part of the solution holding the
+# lowest vertex of a subset is one of its submasks. This takes O(3^n) steps
+def solve_small_component(indptr, indices, s):
+    n = len(indptr) - 1
+    adjacency = [sum(1 << int(u) for u in indices[indptr[v]:indptr[v + 1]]) for v in range(n)]
+    full = (1 << n) - 1
+    club = [S > 0 and is_s_club(adjacency, S, s) for S in range(1 << n)]
+
+    # in_club[S]: S is contained in some s-club (the s-clubs a cover may use, restricted to S)
+    in_club = club[:]
+    for S in range(full, -1, -1):
+        if not in_club[S]:
+            in_club[S] = any(in_club[S | 1 << v] for v in range(n) if not S >> v & 1)
+
+    cover = [0] * (1 << n)
+    partition = [0] * (1 << n)
+    for mask in range(1, 1 << n):
+        lowest = mask & -mask
+        rest = mask & ~lowest
+        cover[mask] = partition[mask] = n
+        sub = rest
+        while True:
+            S = sub | lowest
+            if in_club[S]:
+                cover[mask] = min(cover[mask], 1 + cover[mask & ~S])
+            if club[S]:
+                partition[mask] = min(partition[mask], 1 + partition[mask & ~S])
+            if sub == 0: break
+            sub = (sub - 1) & rest
+    return cover[full], partition[full]
+
+
+# Optimal values of a component that are known without any model, as a dict problem -> value: components of
+# diameter at most s are one s-club, and the other components with at most SMALL_COMPONENT vertices are
+# solved exactly. Returns None for the other components
+def closed_form_values(subgraph, dist_index, s):
+    if diameter_at_most_s(dist_index):
+        return {"Covering": 1, "Partitioning": 1}
+    if subgraph.n <= SMALL_COMPONENT:
+        covering, partitioning = solve_small_component(subgraph.indptr, subgraph.indices, s)
+        return {"Covering": covering, "Partitioning": partitioning}
+    return None
+
+
+# Result of solve_component for a component of n vertices with the given optimal values (a dict problem -> value),
+# found from time start on. For LB+UB, which only takes the components of diameter at most s from here (see
+# scheduler.solve_components), LB is the covering value and UB the partitioning value, both 1. Returns None
+# if the values needed by the problem are not known
+def result_from_values(n, values, problem, start):
+    needed = ["Covering", "Partitioning"] if problem == "LB+UB" else [problem]
+    if any(value not in values for value in needed):
+        return None
+    result = {"|V|": n, "LB Time": 0, "UB Time": 0}
+    if problem == "LB+UB":
+        result["LB"], result["UB"] = values["Covering"], values["Partitioning"]
+    else:
+        result["LB"] = result["UB"] = result["Objective Value"] = result["Objective Bound"] = values[problem]
+    result["Time"] = time.time() - start
+    return result
@@ -0,0 +1,30 @@
+import os
+import sys
+import networkx as nx
+import pytest
+
+# The modules of src are imported flat, as when the code runs from src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+
+
+# Small connected test graphs with vertices 0, ..., n-1: named graphs and seeded random graphs
+def small_graphs():
+    graphs = [nx.path_graph(7), nx.cycle_graph(9), nx.star_graph(6), nx.petersen_graph(), nx.karate_club_graph(),
+              nx.barbell_graph(4, 3), nx.grid_2d_graph(4, 5)]
+    for seed in range(6):
+        graphs.append(nx.gnp_random_graph(30, 0.08, seed=seed))
+        graphs.append(nx.barabasi_albert_graph(40, 2, seed=seed))
+    connected = []
+    for G in graphs:
+        largest = G.subgraph(max(nx.connected_components(G), key=len))
+        connected.append(nx.convert_node_labels_to_integers(largest))
+    return connected
+
+
+# Point the disk cache at an empty temporary folder
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,94 @@
+import os
+import networkx as nx
+import numpy as np
+import cache
+import read
+from distance import DistanceIndex
+
+
+def write_instance(folder, G, name="instance"):
+    with open(os.path.join(folder, name + ".txt"), "w") as f:
+        f.write(str(G.number_of_nodes()) + " " + str(G.number_of_edges()) + "\n")
+        for u, v in G.edges():
+            f.write(str(u) + " " + str(v) + "\n")
+    return name
+
+
+def test_arrays_round_trip(cache_dir):
+    cache.save_arrays("key", "entry", a=np.arange(5), b=np.array(2.5))
+    arrays = cache.load_arrays("key", "entry", ("a", "b"))
+    assert np.array_equal(arrays["a"], np.arange(5)) and float(arrays["b"]) == 2.5
+    assert cache.load_arrays("key", "other") is None
+    assert cache.load_arrays("other", "entry") is None
+
+
+def test_corrupt_entry_is_a_miss_and_deleted(cache_dir):
+    for content in [b"", b"junk", b"PK\x03\x04junk"]:
+        with open(cache.entry_path("key", "entry"), "wb") as f:
+            f.write(content)
+        assert cache.load_arrays("key", "entry") is None
+        assert not os.path.exists(cache.entry_path("key", "entry"))
+
+
+def test_entry_missing_a_field_is_a_miss_and_deleted(cache_dir):
+    cache.save_arrays("key", "entry", a=np.arange(3))
+    assert cache.load_arrays("key", "entry", ("a", "b")) is None
+    assert not os.path.exists(cache.entry_path("key", "entry"))
+
+
+def test_evict_removes_the_least_recently_used(cache_dir):
+    for i in range(4):
+        cache.save_arrays("key", str(i), a=np.arange(1000))
+        os.utime(cache.entry_path("key", str(i)), (1000 + i, 1000 + i))
+    # Loading an entry marks it as recently used
+    assert cache.load_arrays("key", "0") is not None
+    temporary = cache.entry_path("key", "4") + ".123.tmp"
+    with open(temporary, "wb") as f:
+        f.write(b"\0" * 10 ** 5)
+    size = os.path.getsize(cache.entry_path("key", "1"))
+    cache.evict(2 * size)
+    assert sorted(os.listdir(cache_dir)) == sorted(["key_0.npz", "key_3.npz", os.path.basename(temporary)])
+    cache.evict(0)
+    assert os.listdir(cache_dir) == [os.path.basename(temporary)]
+
+
+def test_save_keeps_the_cache_within_its_limit(cache_dir, monkeypatch):
+    cache.save_arrays("key", "0", a=np.arange(1000))
+    monkeypatch.setattr(cache, "MAX_CACHE_BYTES", os.path.getsize(cache.entry_path("key", "0")) + 10)
+    os.utime(cache.entry_path("key", "0"), (1000, 1000))
+    cache.save_arrays("key", "1", a=np.arange(1000))
+    assert os.listdir(cache_dir) == ["key_1.npz"]
+
+
+def test_graph_and_distances_are_cached(cache_dir, tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    G = nx.disjoint_union(nx.petersen_graph(), nx.path_graph(6))
+    G.add_edge(2, 12)
+    G = nx.disjoint_union(G, nx.cycle_graph(5))
+    instance = write_instance(str(folder), G)
+    ext = str(folder) + os.sep
+
+    key, graph, components = cache.load_graph(ext, instance)
+    fresh = read.load_graph(ext, instance)
+    assert os.path.exists(cache.entry_path(key, "graph"))
+    cached_key, cached, cached_components = cache.load_graph(ext, instance)
+    assert cached_key == key and cached.n == fresh.n
+    assert np.array_equal(cached.indptr, fresh.indptr) and np.array_equal(cached.indices, fresh.indices)
+    assert [c.tolist() for c in cached_components] == [c.tolist() for c in fresh.components()]
+    assert [c.tolist() for c in components] == [c.tolist() for c in fresh.components()]
+
+    for s in [2, 3]:
+        built = cache.distance_indices(key, graph, components, s)
+        loaded = cache.distance_indices(key, graph, components, s)
+        for component, first, second in zip(components, built, loaded):
+            expected = DistanceIndex.from_arrays(graph.subgraph(component).indptr,
+                                                 graph.subgraph(component).indices, s)
+            for index in [first, second]:
+                assert np.array_equal(index.ball_indptr, expected.ball_indptr)
+                assert np.array_equal(index.ball_indices, expected.ball_indices)
+                assert np.array_equal(index.ball_dist, expected.ball_dist)
+
+    # A changed file gets a new key
+    write_instance(str(folder), nx.path_graph(4), instance)
+    assert cache.load_graph(ext, instance)[0] != key
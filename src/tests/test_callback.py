@@ -0,0 +1,37 @@
+import random
+import networkx as nx
+import numpy as np
+import pytest
+
+# callback.py adds its cuts through gurobipy
+pytest.importorskip("gurobipy")
+import callback
+
+
+# Sparse solution over the pairs (v, j) of a random subset, with integral or fractional values
+def random_solution(n, labels, seed, integral):
+    rng = random.Random(seed)
+    pairs = rng.sample([(v, j) for v in range(n) for j in range(labels)], n * labels // 3)
+    return {pair: float(rng.random() < 0.5) if integral else rng.random() for pair in pairs}
+
+
+@pytest.mark.parametrize("integral", [True, False])
+def test_label_groups_match_the_scan_of_every_label(integral):
+    G = nx.empty_graph(25)
+    for seed in range(20):
+        xval = random_solution(25, 6, seed, integral)
+        for threshold in [0, 0.5]:
+            groups = callback.label_groups(xval, threshold)
+            for j in range(6):
+                values = callback.label_values(G, xval, j)
+                vertices, group_values = groups.get(j, (np.zeros(0, dtype=np.int64), np.zeros(0)))
+                assert np.array_equal(vertices, np.flatnonzero(values > threshold))
+                assert np.array_equal(group_values, values[values > threshold])
+                if threshold == 0.5:
+                    assert np.array_equal(vertices, callback.cluster_vertices(G, xval, j))
+            assert set(groups) <= set(range(6))
+
+
+def test_label_groups_of_an_empty_solution():
+    assert callback.label_groups({}, 0.5) == {}
+    assert callback.label_groups({(0, 0): 0.2}, 0.5) == {}
@@ -0,0 +1,69 @@
+import networkx as nx
+import numpy as np
+import pytest
+from distance import DistanceIndex
+from conftest import small_graphs
+
+
+# Distances truncated at s computed by networkx, as an n x n matrix with s + 1 for the pairs farther apart
+def reference_distances(G, s):
+    n = G.number_of_nodes()
+    expected = np.full((n, n), s + 1)
+    for v in G.nodes():
+        for u, length in nx.single_source_shortest_path_length(G, v, cutoff=s).items():
+            expected[v, u] = length
+    return expected
+
+
+@pytest.mark.parametrize("s", [1, 2, 3, 4])
+def test_distances_match_networkx(s):
+    for G in small_graphs():
+        expected = reference_distances(G, s)
+        index = DistanceIndex.from_graph(G, s)
+        n = G.number_of_nodes()
+        for v in range(n):
+            assert np.array_equal(index.distances_from(v), expected[v])
+            assert index.dist(v, (3 * v + 1) % n) == expected[v, (3 * v + 1) % n]
+        u, w = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+        assert np.array_equal(index.pair_dist(u.ravel(), w.ravel()), expected.ravel())
+
+
+@pytest.mark.parametrize("s", [2, 3])
+def test_balls_match_networkx(s):
+    for G in small_graphs():
+        expected = reference_distances(G, s)
+        index = DistanceIndex.from_graph(G, s)
+        for r in range(s + 1):
+            indptr, indices = index.balls(r)
+            adjacency = index.power_adjacency(r).toarray()
+            for v in G.nodes():
+                within = np.flatnonzero(expected[v] <= r)
+                assert np.array_equal(index.ball(v, r), within)
+                assert np.array_equal(indices[indptr[v]:indptr[v + 1]], within)
+                assert np.array_equal(np.sort(index.power_neighbors(v, r)), within[within != v])
+                assert np.array_equal(np.flatnonzero(adjacency[v]), within[within != v])
+
+
+# The sparse rows (without the dense matrix) give the same distances
+def test_sparse_rows_without_matrix(monkeypatch):
+    import distance
+    monkeypatch.setattr(distance, "DENSE_LIMIT", 0)
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(6, 6))
+    expected = reference_distances(G, 3)
+    index = DistanceIndex.from_graph(G, 3)
+    assert index.matrix is None
+    for v in G.nodes():
+        assert np.array_equal(index.distances_from(v), expected[v])
+        assert all(index.dist(v, u) == expected[v, u] for u in G.nodes())
+
+
+def test_interval_holds_the_vertices_on_short_paths():
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(4, 4))
+    s = 4
+    expected = reference_distances(G, s)
+    index = DistanceIndex.from_graph(G, s)
+    for u in G.nodes():
+        for v in G.nodes():
+            for r in range(s + 1):
+                on_paths = [w for w in G.nodes() if expected[u, w] + expected[w, v] <= r]
+                assert index.interval(u, v, r).tolist() == on_paths
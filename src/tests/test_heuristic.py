@@ -0,0 +1,49 @@
+import itertools
+import networkx as nx
+import pytest
+from distance import DistanceIndex
+from conftest import small_graphs
+
+# heuristic.py builds its phase I models with Gurobi
+pytest.importorskip("gurobipy")
+import heuristic
+
+
+# Closed neighborhood of the clique Q in the d-th power graph of G
+def closed_neighborhood(G, Q, d):
+    return frozenset(u for v in Q for u in nx.single_source_shortest_path_length(G, v, cutoff=d))
+
+
+def is_maximal_clique(G, Q):
+    return (all(G.has_edge(u, v) for u, v in itertools.combinations(Q, 2)) and
+            not set.intersection(*(set(G[v]) for v in Q)) - set(Q))
+
+
+@pytest.mark.parametrize("d", [1, 2])
+def test_candidates_cover_every_maximal_clique(d):
+    for G in small_graphs():
+        dist_index = DistanceIndex.from_graph(G, d)
+        candidates = heuristic.candidate_cliques(G, dist_index, d)
+        assert all(is_maximal_clique(G, Q) for Q in candidates)
+        covers = [closed_neighborhood(G, Q, d) for Q in candidates]
+
+        # The closed neighborhood of every maximal clique is within the one of a candidate
+        for Q in nx.find_cliques(G):
+            cover = closed_neighborhood(G, Q, d)
+            assert any(cover <= other for other in covers)
+
+        # No candidate is dominated by another one
+        for first, second in itertools.permutations(range(len(covers)), 2):
+            assert not covers[first] <= covers[second]
+
+
+@pytest.mark.parametrize("sampling", heuristic.CLIQUE_SAMPLING)
+def test_capped_candidates_cover_every_vertex(sampling):
+    for G in small_graphs():
+        dist_index = DistanceIndex.from_graph(G, 1)
+        candidates = heuristic.candidate_cliques(G, dist_index, 1, cap=2, sampling=sampling, seed=3)
+        assert all(is_maximal_clique(G, Q) for Q in candidates)
+        assert frozenset().union(*(closed_neighborhood(G, Q, 1) for Q in candidates)) == set(G.nodes())
+        uncapped = heuristic.candidate_cliques(G, dist_index, 1)
+        if len(uncapped) <= 2:
+            assert sorted(map(sorted, candidates)) == sorted(map(sorted, uncapped))
@@ -0,0 +1,80 @@
+import random
+import networkx as nx
+import isomorphism
+from conftest import small_graphs
+
+
+# Copy of G with its vertices relabeled by a random permutation of 0, ..., n-1
+def shuffled(G, seed):
+    labels = list(G.nodes())
+    random.Random(seed).shuffle(labels)
+    H = nx.empty_graph(G.number_of_nodes())
+    H.add_edges_from((labels[u], labels[v]) for u, v in G.edges())
+    return H
+
+
+def test_lookup_hits_isomorphic_graphs_only():
+    results = isomorphism.IsomorphismCache()
+    for seed, G in enumerate(small_graphs()):
+        results.store(G, 2, {"Covering": seed + 1})
+    for seed, G in enumerate(small_graphs()):
+        assert results.lookup(shuffled(G, seed), 2) == {"Covering": seed + 1}
+        assert results.lookup(G, 3) == {}
+
+
+# Two triangles and a 6-cycle have the same Weisfeiler-Lehman hash and edge count, but are not isomorphic
+def test_hash_collisions_are_told_apart():
+    results = isomorphism.IsomorphismCache()
+    triangles = nx.disjoint_union(nx.cycle_graph(3), nx.cycle_graph(3))
+    hexagon = nx.cycle_graph(6)
+    results.store(triangles, 2, {"Partitioning": 2})
+    assert results.lookup(hexagon, 2) == {}
+    results.store(hexagon, 2, {"Partitioning": 3})
+    assert results.lookup(triangles, 2) == {"Partitioning": 2}
+    assert results.lookup(shuffled(hexagon, 0), 2) == {"Partitioning": 3}
+
+
+def test_values_of_both_problems_are_merged():
+    results = isomorphism.IsomorphismCache()
+    G = nx.petersen_graph()
+    results.store(G, 2, {"Covering": 3})
+    results.store(shuffled(G, 1), 2, {"Partitioning": 4})
+    assert results.lookup(shuffled(G, 2), 2) == {"Covering": 3, "Partitioning": 4}
+
+
+def test_disk_entries_are_shared_across_caches(cache_dir):
+    G = nx.karate_club_graph()
+    isomorphism.IsomorphismCache().store(G, 3, {"Covering": 2, "Partitioning": 3}, on_disk=True)
+    assert isomorphism.IsomorphismCache().lookup(shuffled(G, 0), 3, on_disk=True) == {"Covering": 2,
+                                                                                       "Partitioning": 3}
+    assert isomorphism.IsomorphismCache().lookup(shuffled(G, 0), 3) == {}
+    assert isomorphism.IsomorphismCache().lookup(nx.path_graph(34), 3, on_disk=True) == {}
+
+
+def test_memory_entries_are_evicted_least_recently_used_first():
+    results = isomorphism.IsomorphismCache(max_entries=2)
+    graphs = [nx.path_graph(4), nx.star_graph(3), nx.cycle_graph(4)]
+    for value, G in enumerate(graphs):
+        results.store(G, 2, {"Covering": value})
+    assert results.lookup(graphs[0], 2) == {}
+    assert results.lookup(graphs[2], 2) == {"Covering": 2}
+
+
+def test_isomorphism_classes_map_the_representative_onto_its_members():
+    graphs = {}
+    for seed, G in enumerate(small_graphs()[:8]):
+        graphs[3 * seed] = G
+        graphs[3 * seed + 1] = shuffled(G, seed)
+        graphs[3 * seed + 2] = shuffled(G, seed + 100)
+    graphs[100] = nx.disjoint_union(nx.cycle_graph(3), nx.cycle_graph(3))
+    graphs[101] = nx.cycle_graph(6)
+
+    classes = isomorphism.isomorphism_classes(graphs)
+    assert sorted(index for representative, members in classes
+                  for index in [representative] + [member for member, _ in members]) == sorted(graphs)
+    for representative, members in classes:
+        for member, mapping in members:
+            edges = {frozenset((int(mapping[u]), int(mapping[v]))) for u, v in graphs[representative].edges()}
+            assert edges == {frozenset(edge) for edge in graphs[member].edges()}
+    sizes = sorted(1 + len(members) for _, members in classes)
+    assert sizes == [1, 1] + [3] * 8
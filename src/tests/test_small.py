@@ -0,0 +1,69 @@
+import itertools
+import networkx as nx
+import pytest
+import small
+from distance import DistanceIndex, adjacency_arrays
+
+
+def connected_small_graphs():
+    graphs = [nx.path_graph(8), nx.cycle_graph(7), nx.star_graph(6), nx.complete_graph(5),
+              nx.barbell_graph(3, 2), nx.convert_node_labels_to_integers(nx.grid_2d_graph(2, 4))]
+    for seed in range(40):
+        G = nx.gnp_random_graph(7 + seed % 2, 0.3, seed=seed)
+        if nx.is_connected(G):
+            graphs.append(G)
+    return graphs
+
+
+def is_s_club(G, S, s):
+    H = G.subgraph(S)
+    return nx.is_connected(H) and nx.diameter(H) <= s
+
+
+# Set partitions of the list vertices
+def set_partitions(vertices):
+    if not vertices:
+        yield []
+        return
+    first, rest = vertices[0], vertices[1:]
+    for partition in set_partitions(rest):
+        for i in range(len(partition)):
+            yield partition[:i] + [[first] + partition[i]] + partition[i + 1:]
+        yield [[first]] + partition
+
+
+# Minimum number of s-clubs covering and partitioning G, by enumeration
+def brute_force(G, s):
+    vertices = list(G.nodes())
+    clubs = {frozenset(S) for size in range(1, len(vertices) + 1) for S in itertools.combinations(vertices, size)
+             if is_s_club(G, S, s)}
+    maximal = [S for S in clubs if not any(S < other for other in clubs)]
+    covering = next(k for k in range(1, len(vertices) + 1)
+                    if any(frozenset().union(*chosen) == set(vertices)
+                           for chosen in itertools.combinations(maximal, k)))
+    partitioning = min(len(partition) for partition in set_partitions(vertices)
+                       if all(frozenset(part) in clubs for part in partition))
+    return covering, partitioning
+
+
+@pytest.mark.parametrize("s", [2, 3])
+def test_subset_dp_matches_enumeration(s):
+    for G in connected_small_graphs():
+        indptr, indices = adjacency_arrays(G)
+        assert small.solve_small_component(indptr, indices, s) == brute_force(G, s)
+
+
+def test_is_s_club_matches_networkx():
+    G = nx.gnp_random_graph(8, 0.35, seed=1)
+    indptr, indices = adjacency_arrays(G)
+    adjacency = [sum(1 << int(u) for u in indices[indptr[v]:indptr[v + 1]]) for v in range(G.number_of_nodes())]
+    for s in [1, 2, 3]:
+        for S in range(1, 1 << G.number_of_nodes()):
+            vertices = [v for v in G.nodes() if S >> v & 1]
+            assert small.is_s_club(adjacency, S, s) == is_s_club(G, vertices, s)
+
+
+def test_diameter_at_most_s():
+    for G in connected_small_graphs():
+        for s in [1, 2, 3]:
+            assert small.diameter_at_most_s(DistanceIndex.from_graph(G, s)) == (nx.diameter(G) <= s)